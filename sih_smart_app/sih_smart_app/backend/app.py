@@ -1,11 +1,12 @@
 import os
+import uuid
 import traceback
 from datetime import time, datetime, date
 from functools import wraps
 
 import google.generativeai as genai
 import pandas as pd
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_jwt_extended import (
@@ -15,37 +16,99 @@ from flask_jwt_extended import (
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 
-# Lazy loading for heavy libraries to improve startup time
-DeepFace = None
-def load_deepface():
-    global DeepFace
-    if DeepFace is None:
-        from deepface import DeepFace as df
-        DeepFace = df
-    return DeepFace
-
 from config import Config
-from models import db, User, Institution, Branch, Semester, Subject, ClassSchedule, AttendanceRecord, Batch, Section
+from models import db, User, Institution, Branch, Semester, Subject, ClassSchedule, Batch, Section, FaceEmbedding, FaceSample, AttendanceJob, FaceAuditJob, student_subjects
 from admin_routes import admin_bp
 from security_config import create_limiter, configure_security_headers, InputValidator
-
-KNOWN_FACES_DIR = 'known_faces'
+from face_index import load_face_index, fuse_matches
+from gallery_versions import active_gallery_version
+from face_quality import quality_options
+from face_pipeline import decode_image, represent_frames, cascade_options, embed_enrollment_samples, start_warm_up, configure_embedding_backend
+from attendance_jobs import get_job_queue, QueueFullError
+from face_audit import start_face_audit
+from attendance_store import save_attendance_records, check_attendance_storage
+from attendance_rollups import student_attendance_summary, low_attendance
+from attendance_analytics import get_attendance_analytics, note_attendance_saved, AnalyticsWarming
+from result_cache import get_result_cache, attendance_cache_key
+from video_pipeline import represent_video_upload
+from metrics import StageTimings, stage_metrics
+from embedding_batcher import get_embedding_batcher, embedding_batcher_stats
 
 def ensure_dirs(paths):
     for folder in paths:
         if not os.path.exists(folder):
             os.makedirs(folder)
 
+def save_audit_upload(upload_folder, data, filename):
+    """Keep a copy of an attendance photo on disk for auditing"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = f"attendance_{timestamp}_{uuid.uuid4().hex[:8]}_{secure_filename(filename or '') or 'photo'}"
+    path = os.path.join(upload_folder, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+def save_face_sample(samples_dir, institution_id, student_id, data, filename):
+    """Keep an enrollment photo so the gallery can be re-embedded later.
+
+    Returns the path relative to samples_dir.
+    """
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower() or '.jpg'
+    relative_path = os.path.join(str(institution_id), str(student_id), f"{uuid.uuid4().hex}{extension}")
+    path = os.path.join(samples_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return relative_path
+
+def parse_date_arg(name):
+    """An optional YYYY-MM-DD query argument; raises ValueError when malformed"""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+def get_class_roster(class_id, institution_id):
+    """College IDs expected in a class: its section plus open-elective enrollees.
+
+    Returns None when the class does not exist in the institution.
+    """
+    schedule = ClassSchedule.query.join(User, ClassSchedule.teacher_id == User.id).filter(
+        ClassSchedule.id == class_id,
+        User.institution_id == institution_id
+    ).first()
+    if not schedule:
+        return None
+
+    roster = db.session.query(User.college_id).join(
+        student_subjects, student_subjects.c.student_id == User.id
+    ).filter(
+        student_subjects.c.subject_id == schedule.subject_id,
+        User.institution_id == institution_id,
+        User.role == 'student',
+        User.is_active == True
+    )
+    # A class without a section has only its elective enrollees (section_id == None would match every sectionless user)
+    if schedule.section_id is not None:
+        roster = roster.union(db.session.query(User.college_id).filter(
+            User.section_id == schedule.section_id,
+            User.institution_id == institution_id,
+            User.role == 'student',
+            User.is_active == True
+        ))
+    return {college_id for (college_id,) in roster}
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     app.config['UPLOAD_FOLDER'] = 'uploads'
     
-    ensure_dirs([app.config['UPLOAD_FOLDER'], KNOWN_FACES_DIR])
+    ensure_dirs([app.config['UPLOAD_FOLDER'], app.config['KNOWN_FACES_DIR'], app.config['FACE_SAMPLES_DIR']])
+    configure_embedding_backend(app.config['FACE_EMBED_BACKEND'], app.config['FACE_ONNX_DIR'], app.config['FACE_ONNX_THREADS'])
 
     # Initialize Extensions
     db.init_app(app)
     Migrate(app, db)
+    with app.app_context():
+        check_attendance_storage(app.config['ATTENDANCE_STORAGE'], db.engine.dialect.name)
     CORS(app, supports_credentials=True)
     JWTManager(app)
     limiter = create_limiter(app)
@@ -67,6 +130,35 @@ def create_app():
         except:
             return "1. Focus on weak subjects. 2. Review career goals."
 
+    # ---------- Health ----------
+    @app.route('/api/health/ready', methods=['GET'])
+    @limiter.exempt
+    def health_ready():
+        # The first probe of a lazily configured worker starts its warm-up
+        status = start_warm_up(app)
+        ready = status['state'] == 'ready'
+        return jsonify({"ready": ready, "face_pipeline": status}), 200 if ready else 503
+
+    # ---------- Metrics ----------
+    @app.route('/api/metrics', methods=['GET'])
+    @limiter.exempt
+    def metrics():
+        # Histograms are per worker process; scrape every worker (or aggregate by pid)
+        return jsonify({
+            "pid": os.getpid(),
+            "stages": stage_metrics(),
+            "embedding_batcher": embedding_batcher_stats()
+        }), 200
+
+    @app.after_request
+    def record_stage_timings(response):
+        timings = g.pop('stage_timings', None)
+        if timings is not None:
+            timings.record()
+            if app.config['STAGE_TIMING_HEADER']:
+                response.headers['Server-Timing'] = timings.server_timing()
+        return response
+
     # ---------- Authentication Routes ----------
     @app.route('/api/login', methods=['POST'])
     @limiter.limit("10 per minute")
@@ -147,29 +239,299 @@ def create_app():
     @app.route('/api/mark_attendance', methods=['POST'])
     @jwt_required()
     def mark_attendance():
-        file = request.files.get('attendance_photo')
-        if not file: return jsonify({"message": "No photo"}), 400
+        # Several photos of the same session are fused into one present list;
+        # a short panning video can be sent instead
+        files = request.files.getlist('attendance_photo')
+        video = request.files.get('attendance_video')
+        if not files and not video: return jsonify({"message": "No photo"}), 400
+        if len(files) > app.config['MAX_ATTENDANCE_PHOTOS']:
+            return jsonify({"message": f"At most {app.config['MAX_ATTENDANCE_PHOTOS']} photos per request"}), 400
         
-        filename = secure_filename(file.filename)
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(path)
+        # Stage durations go to the worker's histograms (see /api/metrics)
+        timings = g.stage_timings = StageTimings('mark_attendance')
+        
+        # Only match against students expected in this class when it is given
+        roster = None
+        inst_id = get_jwt().get('institution_id')
+        class_id = request.form.get('class_id', type=int)
+        if class_id is not None:
+            with timings.stage('roster'):
+                roster = get_class_roster(class_id, inst_id)
+            if roster is None:
+                return jsonify({"message": "Class not found"}), 404
+        
+        if video:
+            return mark_attendance_from_video(video, roster, inst_id, timings)
+        
+        # Decode straight from the request stream; disk copies only in audit mode
+        images = []
+        for position, file in enumerate(files, start=1):
+            with timings.stage('upload'):
+                data = file.read()
+                if app.config['ATTENDANCE_AUDIT_UPLOADS']:
+                    save_audit_upload(app.config['UPLOAD_FOLDER'], data, file.filename)
+            try:
+                with timings.stage('decode'):
+                    images.append(decode_image(data, app.config['FACE_MAX_IMAGE_DIMENSION']))
+            except ValueError as e:
+                return jsonify({"message": f"Photo {position}: {e}"}), 400
         
         try:
-            df_face = load_deepface()
-            # Searches the entire known_faces directory for multi-sample matches
-            results = df_face.find(img_path=path, db_path=KNOWN_FACES_DIR, enforce_detection=False)
-            present_ids = []
-            for res in results:
-                if not res.empty:
-                    # Identity usually looks like 'known_faces/COLLEGE_ID/sample1.jpg'
-                    identity_path = res.iloc[0].identity
-                    college_id = os.path.basename(os.path.dirname(identity_path))
-                    present_ids.append(college_id)
+            with timings.stage('index'):
+                index = load_face_index(app, inst_id)
+            # Resubmissions of the same photos for the same class reuse the previous result;
+            # the gallery version in the key invalidates it once new faces are enrolled
+            cache = get_result_cache(app) if app.config['ATTENDANCE_CACHE_SIZE'] else None
+            if cache is not None:
+                with timings.stage('cache'):
+                    cache.sync(index.version, scope=inst_id)
+                    cache_key = attendance_cache_key(images, index.version, inst_id, class_id, roster)
+                    cached = cache.get(cache_key)
+                if cached is not None:
+                    return jsonify({**cached, "cached": True}), 200
             
-            return jsonify({"present_college_ids": list(set(present_ids))}), 200
+            # Embed the faces of every photo together, then match them all against the resident gallery at once
+            embeddings, _, rejected = represent_frames(
+                images,
+                app.config['FACE_MODEL_NAME'],
+                app.config['FACE_DETECTOR_BACKEND'],
+                batch_size=app.config['FACE_EMBED_BATCH_SIZE'],
+                workers=app.config['FACE_EMBED_WORKERS'],
+                cascade=cascade_options(app),
+                # A single photo should show the whole class
+                expected_faces=len(roster) if roster is not None and len(images) == 1 else None,
+                quality=quality_options(app),
+                batcher=get_embedding_batcher(app),
+                timings=timings
+            )
+            confidence = {}
+            if len(embeddings):
+                with timings.stage('match'):
+                    matches = index.match(
+                        embeddings,
+                        app.config['FACE_DISTANCE_THRESHOLD'],
+                        college_ids=roster,
+                        institution_id=inst_id
+                    )
+                # A student seen in several photos counts once, with their best similarity
+                confidence = fuse_matches(matches)
+            
+            result = {
+                "present_college_ids": sorted(confidence),
+                "confidence": {college_id: round(score, 4) for college_id, score in confidence.items()},
+                "photos": len(images),
+                "faces_detected": len(embeddings) + len(rejected),
+                # Faces too small, blurred or turned away to be recognised; worth a retake
+                "rejected_faces": rejected
+            }
+            if cache is not None:
+                cache.set(cache_key, result, scope=inst_id)
+            return jsonify(result), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    def mark_attendance_from_video(video, roster, inst_id, timings):
+        """Match one averaged embedding per face track of the video"""
+        try:
+            with timings.stage('index'):
+                index = load_face_index(app, inst_id)
+            embeddings, frames_sampled = represent_video_upload(
+                video,
+                app.config['FACE_MODEL_NAME'],
+                app.config['FACE_DETECTOR_BACKEND'],
+                sample_fps=app.config['ATTENDANCE_VIDEO_SAMPLE_FPS'],
+                max_seconds=app.config['ATTENDANCE_VIDEO_MAX_SECONDS'],
+                max_dimension=app.config['FACE_MAX_IMAGE_DIMENSION'],
+                crops_per_track=app.config['ATTENDANCE_VIDEO_CROPS_PER_TRACK'],
+                batch_size=app.config['FACE_EMBED_BATCH_SIZE'],
+                workers=app.config['FACE_EMBED_WORKERS'],
+                batcher=get_embedding_batcher(app),
+                timings=timings
+            )
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        
+        try:
+            confidence = {}
+            if len(embeddings):
+                with timings.stage('match'):
+                    matches = index.match(
+                        embeddings,
+                        app.config['FACE_DISTANCE_THRESHOLD'],
+                        college_ids=roster,
+                        institution_id=inst_id
+                    )
+                confidence = fuse_matches(matches)
+            return jsonify({
+                "present_college_ids": sorted(confidence),
+                "confidence": {college_id: round(score, 4) for college_id, score in confidence.items()},
+                "frames_sampled": frames_sampled,
+                "face_tracks": len(embeddings)
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    # ---------- Background Attendance Recognition ----------
+    @app.route('/api/attendance_jobs', methods=['POST'])
+    @jwt_required()
+    def submit_attendance_job():
+        file = request.files.get('attendance_photo')
+        if not file: return jsonify({"message": "No photo"}), 400
+
+        roster = None
+        inst_id = get_jwt().get('institution_id')
+        class_id = request.form.get('class_id', type=int)
+        if class_id is not None:
+            roster = get_class_roster(class_id, inst_id)
+            if roster is None:
+                return jsonify({"message": "Class not found"}), 404
+
+        data = file.read()
+        if app.config['ATTENDANCE_AUDIT_UPLOADS']:
+            save_audit_upload(app.config['UPLOAD_FOLDER'], data, file.filename)
+
+        try:
+            job = get_job_queue(app).submit(
+                data, inst_id,
+                class_id=class_id, roster=roster, submitted_by=int(get_jwt_identity())
+            )
+        except QueueFullError as e:
+            response = jsonify({"message": str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"job_id": job.id, "status": job.status}), 202
+
+    @app.route('/api/attendance_jobs/<job_id>', methods=['GET'])
+    @jwt_required()
+    def get_attendance_job(job_id):
+        # ?wait=N long-polls for up to N seconds until the job has finished
+        wait = min(request.args.get('wait', 0, type=float), app.config['ATTENDANCE_JOB_MAX_WAIT'])
+        if wait > 0:
+            get_job_queue(app).wait(job_id, wait)
+            db.session.expire_all()
+
+        job = AttendanceJob.query.filter_by(id=job_id, institution_id=get_jwt().get('institution_id')).first()
+        if not job: return jsonify({"message": "Job not found"}), 404
+        return jsonify(job.to_dict()), 200
+
+    @app.route('/api/attendance_jobs/stats', methods=['GET'])
+    @jwt_required()
+    def attendance_job_stats():
+        inst_id = get_jwt().get('institution_id')
+        by_status = db.session.query(AttendanceJob.status, db.func.count(AttendanceJob.id)).filter_by(
+            institution_id=inst_id
+        ).group_by(AttendanceJob.status).all()
+        return jsonify({
+            "worker": get_job_queue(app).stats(),
+            "institution_jobs": dict(by_status)
+        }), 200
+
+    @app.route('/api/students/<int:student_id>/face_samples', methods=['POST'])
+    @jwt_required()
+    def enroll_face_samples(student_id):
+        claims = get_jwt()
+        if claims.get('role') not in ('admin', 'teacher'):
+            return jsonify({"message": "Admin or teacher access required"}), 403
+
+        inst_id = claims.get('institution_id')
+        student = User.query.filter_by(id=student_id, institution_id=inst_id, role='student').first()
+        if not student: return jsonify({"message": "Student not found"}), 404
+
+        files = request.files.getlist('face_samples')
+        if not files: return jsonify({"message": "No face samples"}), 400
+        if len(files) > app.config['MAX_FACE_SAMPLES']:
+            return jsonify({"message": f"At most {app.config['MAX_FACE_SAMPLES']} samples per request"}), 400
+
+        try:
+            uploads = [f.read() for f in files]
+            images = [decode_image(data, app.config['FACE_MAX_IMAGE_DIMENSION']) for data in uploads]
+            # Detect one face per photo and embed all of them in a single batch
+            embeddings, errors, positions = embed_enrollment_samples(
+                images,
+                app.config['FACE_MODEL_NAME'],
+                app.config['FACE_DETECTOR_BACKEND']
+            )
+            if len(embeddings) == 0:
+                return jsonify({"message": "No usable face samples", "errors": errors}), 400
+
+            version = active_gallery_version(
+                app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'], create=True
+            )
+            # The photos are kept so a re-index can embed them with another model
+            db.session.add_all([
+                FaceEmbedding(
+                    student_id=student.id,
+                    institution_id=inst_id,
+                    sample=FaceSample(
+                        student_id=student.id,
+                        institution_id=inst_id,
+                        image_path=save_face_sample(
+                            app.config['FACE_SAMPLES_DIR'], inst_id, student.id, uploads[position], files[position].filename
+                        )
+                    ),
+                    gallery_version_id=version.id,
+                    model_name=app.config['FACE_MODEL_NAME'],
+                    detector_backend=app.config['FACE_DETECTOR_BACKEND'],
+                    embedding=vector.astype('float32').tobytes()
+                )
+                for vector, position in zip(embeddings, positions)
+            ])
+            version.samples_total = (version.samples_total or 0) + len(embeddings)
+            version.samples_done = (version.samples_done or 0) + len(embeddings)
+            student.face_samples_count = (student.face_samples_count or 0) + len(embeddings)
+            student.has_face_enrolled = True
+            db.session.commit()
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+        # This worker sees the new samples right away; others (and this one,
+        # if the refresh fails) on their next scheduled refresh
+        try:
+            load_face_index(app, inst_id).refresh()
+        except Exception as e:
+            app.logger.warning(f"Face index refresh after enrolling student {student.id} failed: {e}")
+        return jsonify({
+            "enrolled_samples": len(embeddings),
+            "face_samples_count": student.face_samples_count,
+            "errors": errors
+        }), 201
+
+    @app.route('/api/face_audits', methods=['POST'])
+    @jwt_required()
+    def submit_face_audit():
+        # Search the institution's gallery for one face enrolled under two college IDs
+        claims = get_jwt()
+        if claims.get('role') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+
+        threshold = (request.get_json(silent=True) or {}).get('distance_threshold')
+        if threshold is not None and not (isinstance(threshold, (int, float)) and 0 < threshold < 1):
+            return jsonify({"message": "distance_threshold must be between 0 and 1"}), 400
+        try:
+            job = start_face_audit(app, claims.get('institution_id'), int(get_jwt_identity()), threshold)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"job_id": job.id, "status": job.status}), 202
+
+    @app.route('/api/face_audits/<job_id>', methods=['GET'])
+    @jwt_required()
+    def get_face_audit(job_id):
+        claims = get_jwt()
+        if claims.get('role') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+        job = FaceAuditJob.query.filter_by(id=job_id, institution_id=claims.get('institution_id')).first()
+        if not job: return jsonify({"message": "Audit not found"}), 404
+        return jsonify(job.to_dict()), 200
+
     @app.route('/api/save_attendance', methods=['POST'])
     @jwt_required()
     def save_attendance():
@@ -177,18 +539,94 @@ def create_app():
         class_id = data.get('class_id')
         attendance_map = data.get('attendance') # { "COLLEGE_ID": True/False }
         inst_id = get_jwt().get('institution_id')
-        
-        for cid, is_present in attendance_map.items():
-            student = User.query.filter_by(college_id=cid, institution_id=inst_id).first()
-            if student:
-                status = 'present' if is_present else 'absent'
-                record = AttendanceRecord(student_id=student.id, class_id=class_id, status=status, date=date.today())
-                db.session.add(record)
-        db.session.commit()
-        return jsonify({"message": "Success"}), 200
+        if not class_id or not isinstance(attendance_map, dict):
+            return jsonify({"message": "class_id and attendance are required"}), 400
+
+        try:
+            saved, unknown = save_attendance_records(
+                inst_id, class_id, date.today(), attendance_map, app.config['ATTENDANCE_STORAGE']
+            )
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({"message": str(e)}), 404
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+        note_attendance_saved(inst_id)
+        return jsonify({"message": "Success", "saved": saved, "unknown_college_ids": unknown}), 200
+
+    @app.route('/api/students/<int:student_id>/attendance_summary', methods=['GET'])
+    @jwt_required()
+    def attendance_summary(student_id):
+        # ?since=YYYY-MM-DD&until=YYYY-MM-DD, counted in whole months
+        claims = get_jwt()
+        if claims.get('role') == 'student' and int(get_jwt_identity()) != student_id:
+            return jsonify({"message": "Access denied"}), 403
+        student = User.query.filter_by(id=student_id, institution_id=claims.get('institution_id'), role='student').first()
+        if not student: return jsonify({"message": "Student not found"}), 404
+        try:
+            since, until = parse_date_arg('since'), parse_date_arg('until')
+        except ValueError:
+            return jsonify({"message": "Dates must be YYYY-MM-DD"}), 400
+        return jsonify(student_attendance_summary(student.id, since, until)), 200
+
+    @app.route('/api/reports/low_attendance', methods=['GET'])
+    @jwt_required()
+    def low_attendance_report():
+        # ?threshold=75&since=YYYY-MM-DD: students below threshold percent in any subject
+        claims = get_jwt()
+        if claims.get('role') not in ('admin', 'teacher'):
+            return jsonify({"message": "Admin or teacher access required"}), 403
+        try:
+            since, until = parse_date_arg('since'), parse_date_arg('until')
+        except ValueError:
+            return jsonify({"message": "Dates must be YYYY-MM-DD"}), 400
+        threshold = request.args.get('threshold', 75.0, type=float)
+        students = low_attendance(claims.get('institution_id'), threshold, since, until)
+        return jsonify({"threshold": threshold, "students": students}), 200
+
+    @app.route('/api/analytics/at_risk', methods=['GET'])
+    @jwt_required()
+    def at_risk_students():
+        # ?threshold=75: students under threshold percent in any subject this semester
+        claims = get_jwt()
+        if claims.get('role') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+        threshold = request.args.get('threshold', app.config['ANALYTICS_AT_RISK_THRESHOLD'], type=float)
+        try:
+            analytics = get_attendance_analytics(app, claims.get('institution_id'))
+            students = analytics.at_risk(threshold)
+        except AnalyticsWarming as e:
+            response = jsonify({"message": str(e)})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"semester_start": analytics.since.isoformat(), "threshold": threshold, "students": students}), 200
+
+    @app.route('/api/analytics/heatmap', methods=['GET'])
+    @jwt_required()
+    def attendance_heatmap():
+        # Weekly percentages per section, or per student with ?section_id=
+        claims = get_jwt()
+        if claims.get('role') != 'admin':
+            return jsonify({"message": "Admin access required"}), 403
+        section_id = request.args.get('section_id', type=int)
+        try:
+            analytics = get_attendance_analytics(app, claims.get('institution_id'))
+            heatmap = analytics.heatmap(section_id)
+        except AnalyticsWarming as e:
+            response = jsonify({"message": str(e)})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"semester_start": analytics.since.isoformat(), "section_id": section_id, **heatmap}), 200
 
     return app
 
 if __name__ == '__main__':
     app = create_app()
+    if app.config['FACE_WARMUP'] == 'eager':
+        start_warm_up(app)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,582 @@
+# File: backend/attendance_analytics.py
+"""
+Semester attendance analytics of a whole institution: per-subject
+percentages, absence streaks, at-risk students and per-section heatmaps,
+computed with NumPy/pandas over a columnar copy of the institution's
+attendance (both storage modes).
+
+Each web worker keeps one copy per institution. It is loaded with one
+query per storage mode, in a background thread; afterwards only the class
+sessions saved since the last check are read again.
+
+Usage: python attendance_analytics.py benchmark [--students 10000] [--weeks 18] [--storage rows]
+"""
+
+import os
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, case, select, type_coerce, String
+
+from models import db, User, Section, Subject, ClassSchedule, AttendanceRecord, AttendanceSession
+from attendance_sessions import decode_sessions
+
+logger = logging.getLogger(__name__)
+
+# Saves still committing when a refresh runs are picked up by the next one
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+
+class AnalyticsWarming(Exception):
+    """Raised while an institution's analytics are loaded for the first time"""
+
+
+def semester_start(today, configured=None):
+    """SEMESTER_START (YYYY-MM-DD) when set, else 1 January or 1 July"""
+    if configured:
+        return date.fromisoformat(configured)
+    return date(today.year, 1 if today.month < 7 else 7, 1)
+
+
+def _lookup(keys, values, ids, missing=-1):
+    """values[keys == id] for every id, through a dense array indexed by id"""
+    table = np.full(int(max(keys.max(initial=0), ids.max(initial=0))) + 1, missing, dtype=np.int64)
+    table[keys] = values
+    return table[ids]
+
+
+def _percentages(present, total):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.round(100.0 * present / total, 2)
+
+
+def _json_values(values):
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+class InstitutionAttendance:
+    """One institution's attendance since `since`, one row per student and
+    class session: student_id, class_id, day (days since `since`), present.
+
+    Results are computed on first use and kept until a refresh changes the
+    data.
+    """
+
+    def __init__(self, institution_id, since):
+        self.institution_id = institution_id
+        self.since = since
+        self.frame = None
+        self.version = 0
+        self.loaded_at = None
+        self.checked_at = None
+        self.stale = False
+        self._stamps = {}
+        self._results = {}
+        self._lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    # ---------- Loading ----------
+    def _classes(self, query):
+        return query.join(User, ClassSchedule.teacher_id == User.id).filter(User.institution_id == self.institution_id)
+
+    def _saved_sessions(self, after=None):
+        """{(class_id, day): latest save time} of the sessions saved after `after`"""
+        records = self._classes(db.session.query(
+            AttendanceRecord.class_id, AttendanceRecord.date, func.max(AttendanceRecord.timestamp)
+        ).join(ClassSchedule, AttendanceRecord.class_id == ClassSchedule.id)).filter(AttendanceRecord.date >= self.since)
+        sessions = self._classes(db.session.query(
+            AttendanceSession.class_id, AttendanceSession.date, AttendanceSession.timestamp
+        ).join(ClassSchedule, AttendanceSession.class_id == ClassSchedule.id)).filter(AttendanceSession.date >= self.since)
+        if after is None:
+            records = records.group_by(AttendanceRecord.class_id, AttendanceRecord.date)
+        else:
+            # Only a few rows are this recent; grouping them in SQL would
+            # let the planner walk (class_id, date) instead of the timestamp index
+            records = self._classes(db.session.query(
+                AttendanceRecord.class_id, AttendanceRecord.date, AttendanceRecord.timestamp
+            ).join(ClassSchedule, AttendanceRecord.class_id == ClassSchedule.id)).filter(
+                AttendanceRecord.date >= self.since, AttendanceRecord.timestamp >= after
+            )
+            sessions = sessions.filter(AttendanceSession.timestamp >= after)
+
+        stamps = {}
+        for rows in (records.all(), sessions.all()):
+            for class_id, day, saved_at in rows:
+                key = (class_id, (day - self.since).days)
+                stamps[key] = max(filter(None, (stamps.get(key), saved_at)), default=None)
+        return stamps
+
+    def _read_events(self, sessions=None, chunk_size=100000):
+        """Columnar attendance of every session, or only of the given
+        {(class_id, day)} sessions"""
+        # Dates come back as the driver returns them and are converted once
+        # per distinct day instead of once per row
+        records = select(
+            AttendanceRecord.student_id, AttendanceRecord.class_id, type_coerce(AttendanceRecord.date, String),
+            case((AttendanceRecord.status == 'present', 1), else_=0)
+        ).join(ClassSchedule, AttendanceRecord.class_id == ClassSchedule.id).join(
+            User, ClassSchedule.teacher_id == User.id
+        ).where(User.institution_id == self.institution_id, AttendanceRecord.date >= self.since)
+        stored = self._classes(AttendanceSession.query.join(
+            ClassSchedule, AttendanceSession.class_id == ClassSchedule.id
+        )).filter(AttendanceSession.date >= self.since)
+        if sessions is not None:
+            class_ids = sorted({class_id for class_id, _ in sessions})
+            days = sorted({self.since + timedelta(days=int(day)) for _, day in sessions})
+            records = records.where(AttendanceRecord.class_id.in_(class_ids), AttendanceRecord.date.in_(days))
+            stored = stored.filter(AttendanceSession.class_id.in_(class_ids), AttendanceSession.date.in_(days))
+
+        parts = []
+        # On the session's connection, so the rows skip the ORM's result processing
+        result = db.session.connection().execution_options(yield_per=chunk_size).execute(records)
+        for rows in result.partitions():
+            student_ids, class_ids, days, present = zip(*rows)
+            codes, values = pd.factorize(pd.Series(days, dtype=object))
+            offsets = np.array([
+                ((date.fromisoformat(value) if isinstance(value, str) else value) - self.since).days for value in values
+            ], dtype=np.int16)
+            parts.append(pd.DataFrame({
+                'student_id': np.array(student_ids, dtype=np.int32), 'class_id': np.array(class_ids, dtype=np.int32),
+                'day': offsets[codes], 'present': np.array(present, dtype=bool),
+            }))
+        columns = decode_sessions(stored.all())
+        parts.append(pd.DataFrame({
+            'student_id': columns['student_id'].astype(np.int32),
+            'class_id': columns['class_id'].astype(np.int32),
+            'day': (columns['date'] - np.datetime64(self.since, 'D')).astype(np.int16),
+            'present': columns['present'],
+        }))
+        events = pd.concat(parts, ignore_index=True)
+        if sessions is not None:
+            # The IN filters above also match other classes held on those days
+            events = events[np.isin(self._session_keys(events), [class_id * 100000 + day for class_id, day in sessions])]
+        return events
+
+    @staticmethod
+    def _session_keys(events):
+        return events['class_id'].to_numpy(np.int64) * 100000 + events['day'].to_numpy(np.int64)
+
+    def _read_metadata(self):
+        self.students = pd.DataFrame(db.session.query(User.id, User.college_id, User.name, User.section_id).filter(
+            User.institution_id == self.institution_id, User.role == 'student'
+        ).all(), columns=['id', 'college_id', 'name', 'section_id'])
+        self.students['section_id'] = self.students['section_id'].fillna(-1).astype(np.int64)
+        classes = self._classes(db.session.query(ClassSchedule.id, ClassSchedule.subject_id, ClassSchedule.start_time)).all()
+        self.classes = pd.DataFrame({
+            'id': [class_id for class_id, _, _ in classes],
+            'subject_id': [subject_id for _, subject_id, _ in classes],
+            'start_minute': [start.hour * 60 + start.minute for _, _, start in classes],
+        }, dtype=np.int64)
+        subject_ids = self.classes['subject_id'].unique().tolist()
+        self.subjects = dict(db.session.query(Subject.id, Subject.name).filter(Subject.id.in_(subject_ids)).all()) if subject_ids else {}
+        section_ids = self.students.loc[self.students['section_id'] >= 0, 'section_id'].unique().tolist()
+        self.sections = dict(db.session.query(Section.id, Section.name).filter(Section.id.in_(section_ids)).all()) if section_ids else {}
+
+    def load(self):
+        """Read the whole semester. Needs an app context."""
+        started = time.perf_counter()
+        checked_at = datetime.utcnow()
+        # Save times are read before the attendance, so a save landing in
+        # between is read again by the next refresh rather than missed
+        stamps = self._saved_sessions()
+        self._read_metadata()
+        frame = self._read_events()
+        with self._lock:
+            self.frame, self._stamps = frame, stamps
+            self.loaded_at = self.checked_at = checked_at
+            self.stale = False
+            self.version += 1
+            self._results = {}
+        logger.info(
+            f"Loaded {len(frame)} attendance rows of institution {self.institution_id} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return len(frame)
+
+    def refresh(self):
+        """Re-read only the sessions saved since the last check. Returns how
+        many sessions changed. Needs an app context."""
+        if self.frame is None:
+            self.load()
+            return len(self._stamps)
+        checked_at = datetime.utcnow()
+        stamps = self._saved_sessions(after=self.checked_at - REFRESH_OVERLAP)
+        changed = {key: saved_at for key, saved_at in stamps.items() if self._stamps.get(key) != saved_at}
+        if not changed:
+            self.checked_at, self.stale = checked_at, False
+            return 0
+
+        started = time.perf_counter()
+        self._read_metadata()
+        events = self._read_events(changed)
+        frame, results = self.frame, dict(self._results)
+        removed = np.isin(self._session_keys(frame), [class_id * 100000 + day for class_id, day in changed])
+        affected = np.union1d(frame['student_id'].to_numpy()[removed], events['student_id'].to_numpy())
+        frame = pd.concat([frame[~removed], events], ignore_index=True)
+
+        # Per-student tables only change for the students of the changed sessions
+        updated = {}
+        touched = frame[np.isin(frame['student_id'].to_numpy(), affected)]
+        for key, compute in (('subject_stats', self._subject_stats), ('streaks', self._streaks)):
+            if key in results:
+                table = results[key]
+                kept = table[~table.index.get_level_values('student_id').isin(affected)]
+                updated[key] = pd.concat([kept, compute(touched)]).sort_index()
+        with self._lock:
+            self.frame, self._results = frame, updated
+            self._stamps.update(changed)
+            self.checked_at, self.stale = checked_at, False
+            self.version += 1
+        logger.info(
+            f"Refreshed {len(changed)} sessions of institution {self.institution_id} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return len(changed)
+
+    # ---------- Results ----------
+    def _cached(self, key, compute):
+        with self._lock:
+            frame, version = self.frame, self.version
+            if key in self._results:
+                return self._results[key]
+        result = compute(frame)
+        with self._lock:
+            if self.version == version:
+                self._results[key] = result
+        return result
+
+    def _subject_stats(self, frame):
+        subject_ids = _lookup(self.classes['id'].to_numpy(), self.classes['subject_id'].to_numpy(), frame['class_id'].to_numpy())
+        stats = pd.DataFrame({
+            'student_id': frame['student_id'].to_numpy(), 'subject_id': subject_ids,
+            'present': frame['present'].to_numpy(np.int64)
+        }).groupby(['student_id', 'subject_id'])['present'].agg(present='sum', total='size')
+        stats['percentage'] = _percentages(stats['present'].to_numpy(), stats['total'].to_numpy())
+        return stats
+
+    def _streaks(self, frame):
+        if frame.empty:
+            return pd.DataFrame({'current': [], 'longest': []}, index=pd.Index([], name='student_id'), dtype=np.int64)
+        start_minutes = _lookup(self.classes['id'].to_numpy(), self.classes['start_minute'].to_numpy(), frame['class_id'].to_numpy())
+        students = frame['student_id'].to_numpy()
+        order = np.lexsort((frame['class_id'].to_numpy(), start_minutes, frame['day'].to_numpy(), students))
+        students, present = students[order], frame['present'].to_numpy()[order]
+
+        # Runs of equal status per student: where the student or the status changes
+        starts = np.flatnonzero(np.r_[True, (students[1:] != students[:-1]) | (present[1:] != present[:-1])])
+        lengths = np.diff(np.r_[starts, len(students)])
+        run_students, absent = students[starts], ~present[starts]
+        last_run = np.r_[run_students[1:] != run_students[:-1], True]
+
+        result = pd.DataFrame({
+            'student_id': run_students,
+            'longest': np.where(absent, lengths, 0),
+            'current': np.where(absent & last_run, lengths, 0),
+        }).groupby('student_id').max()
+        return result[['current', 'longest']]
+
+    def subject_stats(self):
+        """present, total and percentage per (student_id, subject_id)"""
+        return self._cached('subject_stats', self._subject_stats)
+
+    def streaks(self):
+        """Per student_id: the classes missed in a row up to the latest
+        session (current) and the longest such run this semester"""
+        return self._cached('streaks', self._streaks)
+
+    def at_risk(self, threshold=75.0):
+        """Students below threshold percent in at least one subject, lowest
+        subject percentage first"""
+        def compute(frame):
+            stats = self.subject_stats()
+            low = stats[stats['percentage'] < threshold].reset_index().sort_values(['student_id', 'percentage'])
+            if low.empty:
+                return []
+            risky_ids = low['student_id'].unique()
+            overall = stats.groupby(level='student_id')[['present', 'total']].sum().loc[risky_ids]
+            students = self.students.set_index('id').reindex(risky_ids)
+            students['section'] = students['section_id'].map(self.sections)
+            students['percentage'] = _percentages(overall['present'].to_numpy(), overall['total'].to_numpy())
+            students = students.join(self.streaks())
+            low['subject'] = low['subject_id'].map(self.subjects)
+
+            subjects = {}
+            for row in low.to_dict('records'):
+                subjects.setdefault(row.pop('student_id'), []).append(row)
+            risky = [
+                {
+                    'student_id': int(student_id), 'college_id': college_id, 'name': name,
+                    'section': section if isinstance(section, str) else None, 'percentage': float(percentage),
+                    'current_absence_streak': int(current), 'longest_absence_streak': int(longest),
+                    'subjects': subjects[student_id],
+                }
+                for student_id, college_id, name, section, percentage, current, longest in students[
+                    ['college_id', 'name', 'section', 'percentage', 'current', 'longest']
+                ].itertuples()
+            ]
+            return sorted(risky, key=lambda student: (student['subjects'][0]['percentage'], student['college_id'] or ''))
+        return self._cached(('at_risk', float(threshold)), compute)
+
+    def heatmap(self, section_id=None):
+        """Weekly attendance percentages: one row per section, or per student
+        of one section. Weeks start on Monday; empty cells are None."""
+        def compute(frame):
+            first_monday = self.since - timedelta(days=self.since.weekday())
+            weeks = (frame['day'].to_numpy(np.int64) + self.since.weekday()) // 7
+            students = self.students
+            sections = _lookup(students['id'].to_numpy(), students['section_id'].to_numpy(), frame['student_id'].to_numpy())
+            if section_id is None:
+                rows, keep = sections, sections >= 0
+                labels = sorted(self.sections.items(), key=lambda item: item[1])
+                row_ids = [section for section, _ in labels]
+                row_labels = [{'section_id': section, 'section': name} for section, name in labels]
+            else:
+                rows, keep = frame['student_id'].to_numpy(np.int64), sections == section_id
+                members = students[students['section_id'] == section_id].sort_values('college_id')
+                row_ids = members['id'].tolist()
+                row_labels = [
+                    {'student_id': int(student_id), 'college_id': college_id, 'name': name}
+                    for student_id, college_id, name in members[['id', 'college_id', 'name']].itertuples(index=False)
+                ]
+
+            week_count = int(weeks.max()) + 1 if len(weeks) else 0
+            grouped = pd.DataFrame({
+                'row': rows[keep], 'week': weeks[keep], 'present': frame['present'].to_numpy(np.int64)[keep]
+            }).groupby(['row', 'week'])['present'].agg(['sum', 'size'])
+            present = grouped['sum'].unstack(fill_value=0).reindex(index=row_ids, columns=range(week_count), fill_value=0)
+            total = grouped['size'].unstack(fill_value=0).reindex(index=row_ids, columns=range(week_count), fill_value=0)
+            values = _percentages(present.to_numpy(np.float64), total.to_numpy(np.float64))
+            return {
+                'weeks': [(first_monday + timedelta(weeks=week)).isoformat() for week in range(week_count)],
+                'rows': row_labels,
+                'values': [_json_values(row) for row in values],
+            }
+        return self._cached(('heatmap', section_id), compute)
+
+
+# One cache per web worker, keyed by institution
+_analytics = {}
+_loading = set()
+_analytics_lock = threading.Lock()
+
+
+def get_attendance_analytics(app, institution_id, today=None):
+    """This worker's analytics of an institution's current semester, checked
+    for newly saved sessions at most every ANALYTICS_REFRESH_SECONDS (or
+    right after a save in this worker). Needs an app context.
+
+    Full loads run in a background thread: the first one raises
+    AnalyticsWarming until it is done, a reload every ANALYTICS_RELOAD_HOURS
+    serves the previous copy meanwhile.
+    """
+    since = semester_start(today or date.today(), app.config['SEMESTER_START'])
+    with _analytics_lock:
+        analytics = _analytics.get(institution_id)
+        current = analytics is not None and analytics.since == since
+        # A full reload also drops sessions whose students or classes were deleted
+        due = not current or datetime.utcnow() - analytics.loaded_at >= timedelta(hours=app.config['ANALYTICS_RELOAD_HOURS'])
+        if due and institution_id not in _loading:
+            _loading.add(institution_id)
+            threading.Thread(
+                target=_load_in_background, args=(app, institution_id, since),
+                name=f"analytics-load-{institution_id}", daemon=True
+            ).start()
+    if not current:
+        raise AnalyticsWarming(f"Attendance analytics of institution {institution_id} are loading")
+
+    if analytics.stale or (datetime.utcnow() - analytics.checked_at).total_seconds() >= app.config['ANALYTICS_REFRESH_SECONDS']:
+        # A request finding a refresh already running serves the copy as it is
+        if analytics.refresh_lock.acquire(blocking=False):
+            try:
+                analytics.refresh()
+            finally:
+                analytics.refresh_lock.release()
+    return analytics
+
+
+def _load_in_background(app, institution_id, since):
+    """Load a fresh copy and swap it in once complete"""
+    try:
+        with app.app_context():
+            analytics = InstitutionAttendance(institution_id, since)
+            try:
+                analytics.load()
+            finally:
+                db.session.remove()
+        # Saves noted on the previous copy while this one loaded are read by its first refresh
+        analytics.stale = True
+        with _analytics_lock:
+            _analytics[institution_id] = analytics
+    except Exception as e:
+        logger.error(f"Loading the attendance analytics of institution {institution_id} failed: {e}")
+    finally:
+        with _analytics_lock:
+            _loading.discard(institution_id)
+
+
+def note_attendance_saved(institution_id):
+    """Make this worker's next read of the institution pick up the save"""
+    analytics = _analytics.get(institution_id)
+    if analytics is not None:
+        analytics.stale = True
+
+
+# ---------- Benchmark ----------
+def seed_semester(students, weeks, storage='rows', section_size=60, classes_per_day=6, seed=0):
+    """Fill an empty schema with one institution of `students` students in
+    sections of section_size, each with classes_per_day classes every
+    weekday for `weeks` weeks from the last-but-`weeks` Monday. Every
+    student has their own attendance rate, so some fall below 75%.
+    Returns the semester's first day. Needs an app context."""
+    from models import Institution, Branch, Semester, Batch, AttendanceRoster
+    from attendance_sessions import encode_bits
+
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    since = today - timedelta(days=today.weekday(), weeks=weeks)
+    sections = -(-students // section_size)
+    db.create_all()
+    db.session.add(Institution(id=1, name='Benchmark', registration_code='BENCH'))
+    db.session.add(Branch(id=1, name='Computer Science', code='CSE', institution_id=1))
+    db.session.add(Semester(id=1, number=1, branch_id=1))
+    db.session.add(Batch(id=1, name='2026', institution_id=1))
+    db.session.flush()
+    db.session.execute(Subject.__table__.insert(), [
+        {'id': slot + 1, 'name': f"Subject {slot + 1}", 'code': f"SUB{slot + 1}", 'semester_id': 1}
+        for slot in range(classes_per_day)
+    ])
+    db.session.execute(Section.__table__.insert(), [
+        {'id': section + 1, 'name': f"S{section + 1}", 'batch_id': 1, 'branch_id': 1} for section in range(sections)
+    ])
+    teachers = sections * classes_per_day
+    db.session.execute(User.__table__.insert(), [
+        {'id': teacher + 1, 'college_id': f"T{teacher:06d}", 'password_hash': '-', 'name': f"Teacher {teacher}",
+         'role': 'teacher', 'institution_id': 1, 'section_id': None}
+        for teacher in range(teachers)
+    ] + [
+        {'id': teachers + student + 1, 'college_id': f"S{student:06d}", 'password_hash': '-', 'name': f"Student {student}",
+         'role': 'student', 'institution_id': 1, 'section_id': student // section_size + 1}
+        for student in range(students)
+    ])
+    # Class (section, weekday, slot) is taught by teacher (section, slot)
+    class_id = lambda section, weekday, slot: (section * 5 + weekday) * classes_per_day + slot + 1
+    db.session.execute(ClassSchedule.__table__.insert(), [
+        {'id': class_id(section, weekday, slot), 'subject_id': slot + 1, 'teacher_id': section * classes_per_day + slot + 1,
+         'section_id': section + 1, 'day_of_week': weekday, 'start_time': datetime.min.replace(hour=9 + slot).time(),
+         'end_time': datetime.min.replace(hour=10 + slot).time()}
+        for section in range(sections) for weekday in range(5) for slot in range(classes_per_day)
+    ])
+
+    rates = np.clip(rng.beta(14, 2, size=students)[:, None] + rng.normal(0, 0.05, size=(students, classes_per_day)), 0, 1)
+    student_ids = np.arange(students) + teachers + 1
+    rosters = {}
+    written = 0
+    for week in range(weeks):
+        for weekday in range(5):
+            day = since + timedelta(weeks=week, days=weekday)
+            present = rng.random((students, classes_per_day)) < rates
+            rows = []
+            for section in range(sections):
+                members = slice(section * section_size, min((section + 1) * section_size, students))
+                for slot in range(classes_per_day):
+                    session_class = class_id(section, weekday, slot)
+                    saved_at = datetime.combine(day, datetime.min.replace(hour=10 + slot).time())
+                    if storage == 'bitset':
+                        if session_class not in rosters:
+                            roster = AttendanceRoster(
+                                class_id=session_class, size=len(student_ids[members]),
+                                student_ids=student_ids[members].astype('<i4').tobytes()
+                            )
+                            db.session.add(roster)
+                            db.session.flush()
+                            rosters[session_class] = roster.id
+                        rows.append({
+                            'class_id': session_class, 'date': day, 'roster_id': rosters[session_class],
+                            'present_bits': encode_bits(present[members, slot]),
+                            'marked_bits': encode_bits(np.ones(len(student_ids[members]), dtype=bool)), 'timestamp': saved_at
+                        })
+                    else:
+                        rows.extend(
+                            {'student_id': int(student_id), 'class_id': session_class, 'date': day,
+                             'status': 'present' if is_present else 'absent', 'timestamp': saved_at}
+                            for student_id, is_present in zip(student_ids[members], present[members, slot])
+                        )
+            table = AttendanceSession.__table__ if storage == 'bitset' else AttendanceRecord.__table__
+            db.session.execute(table.insert(), rows)
+            written += students * classes_per_day
+    db.session.commit()
+    return since, written
+
+
+if __name__ == "__main__":
+    from flask import Flask
+
+    from config import Config
+    from attendance_store import save_attendance_records
+
+    parser = argparse.ArgumentParser(description="Time the semester analytics on a synthetic institution")
+    parser.add_argument('command', choices=['benchmark'])
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--weeks', type=int, default=18, help="length of the semester")
+    parser.add_argument('--storage', choices=['rows', 'bitset'], default='rows')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    try:
+        with app.app_context():
+            started = time.perf_counter()
+            since, written = seed_semester(args.students, args.weeks, args.storage)
+            print(f"Seeded {written} attendance marks ({args.storage}) in {time.perf_counter() - started:.0f}s")
+            app.config['SEMESTER_START'] = since.isoformat()
+            today = since + timedelta(weeks=args.weeks)
+            timings = {}
+
+            started = time.perf_counter()
+            analytics = InstitutionAttendance(1, since)
+            analytics.load()
+            timings['load'] = time.perf_counter() - started
+            for name, compute in [
+                ('subject percentages', analytics.subject_stats), ('absence streaks', analytics.streaks),
+                ('at-risk students', lambda: analytics.at_risk(app.config['ANALYTICS_AT_RISK_THRESHOLD'])),
+                ('section heatmap', analytics.heatmap), ('student heatmap of one section', lambda: analytics.heatmap(1)),
+            ]:
+                started = time.perf_counter()
+                compute()
+                timings[name] = time.perf_counter() - started
+            at_risk = analytics.at_risk(app.config['ANALYTICS_AT_RISK_THRESHOLD'])
+
+            # One more class session, then the incremental refresh it triggers
+            college_ids = [college_id for (college_id,) in db.session.query(User.college_id).filter_by(section_id=1, role='student')]
+            save_attendance_records(1, 1, today, {college_id: False for college_id in college_ids}, args.storage)
+            started = time.perf_counter()
+            analytics.refresh()
+            timings['refresh after one saved session'] = time.perf_counter() - started
+            started = time.perf_counter()
+            refreshed = analytics.at_risk(app.config['ANALYTICS_AT_RISK_THRESHOLD'])
+            timings['at-risk students again'] = time.perf_counter() - started
+
+            reloaded = InstitutionAttendance(1, since)
+            reloaded.load()
+            matches = reloaded.at_risk(app.config['ANALYTICS_AT_RISK_THRESHOLD']) == refreshed and reloaded.heatmap() == analytics.heatmap()
+
+        for name, seconds in timings.items():
+            print(f"{name:>34}: {seconds * 1000:9.1f} ms")
+        print(f"{len(analytics.frame)} marks, {len(at_risk)} students at risk before the extra session, {len(refreshed)} after")
+        if not matches:
+            print("❌ The incrementally refreshed results differ from a full reload")
+        else:
+            print("✅ Incremental refresh matches a full reload")
+    finally:
+        os.remove(path)
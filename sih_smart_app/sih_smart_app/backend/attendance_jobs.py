@@ -0,0 +1,220 @@
+# File: backend/attendance_jobs.py
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, AttendanceJob
+from face_index import load_face_index
+from face_pipeline import decode_image, represent_frames, cascade_options, warm_model, configure_embedding_backend
+from face_quality import quality_options
+from metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when every recognition slot of this worker is taken"""
+
+
+# ---------- Pool process side ----------
+def _init_recognition_process(model_name, detector_backend, embed_backend='tensorflow', onnx_dir=None, onnx_threads=0):
+    """Load the model once per pool process so jobs never pay for it"""
+    configure_embedding_backend(embed_backend, onnx_dir, onnx_threads)
+    try:
+        warm_model(model_name, detector_backend)
+    except Exception as e:
+        logger.error(f"Recognition process warm-up failed: {e}")
+
+
+def _recognize_photo(image_bytes, model_name, detector_backend, batch_size, max_dimension,
+                     cascade=None, quality=None, expected_faces=None):
+    """Decode a photo and embed its faces (runs in a pool process).
+
+    Goes through the same detector cascade and quality gate as the
+    synchronous mark_attendance path.
+    """
+    started = time.time()
+    img = decode_image(image_bytes, max_dimension)
+    embeddings, _, rejected = represent_frames(
+        [img], model_name, detector_backend, batch_size=batch_size,
+        cascade=cascade, expected_faces=expected_faces, quality=quality
+    )
+    return {'embeddings': embeddings, 'rejected': rejected, 'started': started, 'finished': time.time()}
+
+
+# ---------- Web worker side ----------
+class RecognitionJobQueue:
+    """Bounded queue of recognition jobs backed by a local process pool.
+
+    Job state is kept in the AttendanceJob table so any web worker can
+    answer a poll; matching against the gallery happens in the submitting
+    worker once the pool returns the embeddings.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config['ATTENDANCE_JOB_WORKERS']
+        self.max_pending = app.config['ATTENDANCE_JOB_QUEUE_SIZE']
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._events = {}
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+        self._queue_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # TensorFlow is not fork-safe, so pool processes are spawned fresh
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_recognition_process,
+                initargs=(
+                    self.app.config['FACE_MODEL_NAME'], self.app.config['FACE_DETECTOR_BACKEND'],
+                    self.app.config['FACE_EMBED_BACKEND'], self.app.config['FACE_ONNX_DIR'], self.app.config['FACE_ONNX_THREADS']
+                )
+            )
+        return self._executor
+
+    def submit(self, image_bytes, institution_id, class_id=None, roster=None, submitted_by=None):
+        """Queue a photo for recognition; raises QueueFullError when saturated"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counters['rejected'] += 1
+                raise QueueFullError(f"Recognition queue is full ({self.max_pending} jobs)")
+            self._pending += 1
+            self.counters['submitted'] += 1
+
+        job = None
+        try:
+            self._purge_old_jobs()
+            job = AttendanceJob(
+                id=uuid.uuid4().hex,
+                institution_id=institution_id,
+                class_id=class_id,
+                submitted_by=submitted_by,
+                status='queued'
+            )
+            db.session.add(job)
+            db.session.commit()
+
+            self._events[job.id] = threading.Event()
+            future = self._get_executor().submit(
+                _recognize_photo, image_bytes,
+                self.app.config['FACE_MODEL_NAME'], self.app.config['FACE_DETECTOR_BACKEND'],
+                self.app.config['FACE_EMBED_BATCH_SIZE'], self.app.config['FACE_MAX_IMAGE_DIMENSION'],
+                cascade_options(self.app), quality_options(self.app), len(roster) if roster is not None else None
+            )
+        except Exception as e:
+            db.session.rollback()
+            if job is not None and job.id in self._events:
+                job.status = 'failed'
+                job.error = str(e)
+                db.session.commit()
+                self._events.pop(job.id).set()
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        job_id = job.id
+        future.add_done_callback(lambda f: self._finish(job_id, f, institution_id, roster))
+        return job
+
+    def _finish(self, job_id, future, institution_id, roster):
+        """Match the returned embeddings and record the outcome"""
+        try:
+            with self.app.app_context():
+                job = db.session.get(AttendanceJob, job_id)
+                try:
+                    result = future.result()
+                    present_ids = set()
+                    match_started = time.perf_counter()
+                    if len(result['embeddings']):
+                        index = load_face_index(self.app, institution_id)
+                        matches = index.match(
+                            result['embeddings'],
+                            self.app.config['FACE_DISTANCE_THRESHOLD'],
+                            college_ids=roster,
+                            institution_id=institution_id
+                        )
+                        present_ids = {college_id for college_id, _ in matches if college_id}
+                    observe_stage('attendance_job.match', 1000 * (time.perf_counter() - match_started))
+                    job.status = 'done'
+                    job.faces_detected = len(result['embeddings']) + len(result['rejected'])
+                    job.present_college_ids = sorted(present_ids)
+                    job.started_at = datetime.utcfromtimestamp(result['started'])
+                    job.finished_at = datetime.utcfromtimestamp(result['finished'])
+                    queue_seconds = max((job.started_at - job.submitted_at).total_seconds(), 0)
+                    run_seconds = result['finished'] - result['started']
+                    observe_stage('attendance_job.queue', 1000 * queue_seconds)
+                    observe_stage('attendance_job.recognize', 1000 * run_seconds)
+                    with self._lock:
+                        self.counters['completed'] += 1
+                        self._queue_seconds += queue_seconds
+                        self._run_seconds += run_seconds
+                except Exception as e:
+                    logger.error(f"Recognition job {job_id} failed: {e}")
+                    job.status = 'failed'
+                    job.error = str(e)
+                    job.finished_at = datetime.utcnow()
+                    with self._lock:
+                        self.counters['failed'] += 1
+                db.session.commit()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            event = self._events.pop(job_id, None)
+            if event:
+                event.set()
+
+    def _purge_old_jobs(self):
+        cutoff = datetime.utcnow() - timedelta(hours=self.app.config['ATTENDANCE_JOB_RETENTION_HOURS'])
+        AttendanceJob.query.filter(AttendanceJob.submitted_at < cutoff).delete()
+
+    def wait(self, job_id, timeout):
+        """Block until the job has finished or the timeout expires (long-poll).
+
+        Jobs owned by another web worker are polled from the database.
+        """
+        event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            job = db.session.get(AttendanceJob, job_id)
+            if job is None or job.status != 'queued':
+                return
+            time.sleep(0.5)
+
+    def stats(self):
+        with self._lock:
+            completed = self.counters['completed']
+            return {
+                'workers': self.workers,
+                'queue_capacity': self.max_pending,
+                'queue_depth': self._pending,
+                'counters': dict(self.counters),
+                'avg_queue_ms': round(1000 * self._queue_seconds / completed) if completed else None,
+                'avg_run_ms': round(1000 * self._run_seconds / completed) if completed else None
+            }
+
+
+# One queue (and process pool) per web worker
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(app):
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = RecognitionJobQueue(app)
+    return _job_queue
@@ -0,0 +1,186 @@
+# File: backend/attendance_rollups.py
+"""
+Attendance percentages from the per-student, per-subject, per-month
+counters in AttendanceRollup instead of counting AttendanceRecord rows.
+save_attendance keeps the counters current; rebuild them from the raw
+records after a backfill or a manual fix.
+
+Usage: python attendance_rollups.py rebuild [--institution 1]
+"""
+
+import time
+import logging
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import extract, func, case
+
+from models import db, User, Subject, ClassSchedule, AttendanceRecord, AttendanceRollup, AttendanceSession
+from attendance_sessions import decode_sessions
+
+logger = logging.getLogger(__name__)
+
+
+def _percentage(present, total):
+    return round(100.0 * present / total, 2) if total else None
+
+
+def _session_counters(institution_id=None, chunk_size=2000):
+    """{(institution_id, student_id, subject_id, month): [present, total]}
+    of the sessions stored as bitsets"""
+    query = db.session.query(AttendanceSession, ClassSchedule.subject_id, User.institution_id).join(
+        ClassSchedule, AttendanceSession.class_id == ClassSchedule.id
+    ).join(User, ClassSchedule.teacher_id == User.id)
+    if institution_id is not None:
+        query = query.filter(User.institution_id == institution_id)
+
+    counters, chunk = {}, []
+
+    def add(chunk):
+        subjects = {session.class_id: subject_id for session, subject_id, _ in chunk}
+        institutions = {session.class_id: inst_id for session, _, inst_id in chunk}
+        columns = decode_sessions([session for session, _, _ in chunk])
+        frame = pd.DataFrame({
+            'student_id': columns['student_id'],
+            'class_id': columns['class_id'],
+            'month': columns['date'].astype('datetime64[M]'),
+            'present': columns['present'].astype(np.int64),
+        })
+        frame['subject_id'] = frame['class_id'].map(subjects)
+        frame['institution_id'] = frame['class_id'].map(institutions)
+        grouped = frame.groupby(['institution_id', 'student_id', 'subject_id', 'month'])['present'].agg(['sum', 'count'])
+        for (inst_id, student_id, subject_id, month), (present, total) in grouped.iterrows():
+            found = counters.setdefault((int(inst_id), int(student_id), int(subject_id), month.date()), [0, 0])
+            found[0] += int(present)
+            found[1] += int(total)
+
+    for row in query.yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            add(chunk)
+            chunk = []
+    if chunk:
+        add(chunk)
+    return counters
+
+
+def rebuild_rollups(institution_id=None, chunk_size=5000):
+    """Recompute the counters from the stored attendance, in either
+    storage mode, in one transaction so readers see either the old
+    counters or the new ones. Needs an app context."""
+    started = time.perf_counter()
+    sessions = _session_counters(institution_id)
+    year, month = extract('year', AttendanceRecord.date), extract('month', AttendanceRecord.date)
+    query = db.session.query(
+        User.institution_id, AttendanceRecord.student_id, ClassSchedule.subject_id, year, month,
+        func.sum(case((AttendanceRecord.status == 'present', 1), else_=0)), func.count(AttendanceRecord.id)
+    ).join(
+        ClassSchedule, AttendanceRecord.class_id == ClassSchedule.id
+    ).join(
+        User, AttendanceRecord.student_id == User.id
+    ).group_by(User.institution_id, AttendanceRecord.student_id, ClassSchedule.subject_id, year, month)
+    existing = AttendanceRollup.query
+    if institution_id is not None:
+        query = query.filter(User.institution_id == institution_id)
+        existing = existing.filter(AttendanceRollup.institution_id == institution_id)
+
+    try:
+        existing.delete(synchronize_session=False)
+        rows, written = [], 0
+        for inst_id, student_id, subject_id, row_year, row_month, present, total in query.yield_per(chunk_size):
+            month = date(int(row_year), int(row_month), 1)
+            from_sessions = sessions.pop((inst_id, student_id, subject_id, month), (0, 0))
+            rows.append({
+                'institution_id': inst_id, 'student_id': student_id, 'subject_id': subject_id, 'month': month,
+                'present': int(present) + from_sessions[0], 'total': int(total) + from_sessions[1]
+            })
+            if len(rows) == chunk_size:
+                db.session.execute(AttendanceRollup.__table__.insert(), rows)
+                written += len(rows)
+                rows = []
+        rows.extend(
+            {'institution_id': inst_id, 'student_id': student_id, 'subject_id': subject_id,
+             'month': month, 'present': present, 'total': total}
+            for (inst_id, student_id, subject_id, month), (present, total) in sessions.items()
+        )
+        if rows:
+            db.session.execute(AttendanceRollup.__table__.insert(), rows)
+            written += len(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Rebuilt {written} attendance rollups in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+def _month_range(query, since=None, until=None):
+    if since is not None:
+        query = query.filter(AttendanceRollup.month >= since.replace(day=1))
+    if until is not None:
+        query = query.filter(AttendanceRollup.month <= until.replace(day=1))
+    return query
+
+
+def student_attendance_summary(student_id, since=None, until=None):
+    """Per-subject and overall attendance of a student, whole months from
+    since to until. Reads one counter row per subject and month."""
+    rows = _month_range(db.session.query(
+        AttendanceRollup.subject_id, Subject.name,
+        func.sum(AttendanceRollup.present), func.sum(AttendanceRollup.total)
+    ).join(Subject, AttendanceRollup.subject_id == Subject.id).filter(
+        AttendanceRollup.student_id == student_id
+    ), since, until).group_by(AttendanceRollup.subject_id, Subject.name).all()
+
+    subjects = [
+        {
+            'subject_id': subject_id, 'subject': name, 'present': int(present), 'total': int(total),
+            'percentage': _percentage(present, total)
+        }
+        for subject_id, name, present, total in rows
+    ]
+    present = sum(subject['present'] for subject in subjects)
+    total = sum(subject['total'] for subject in subjects)
+    return {'subjects': subjects, 'present': present, 'total': total, 'percentage': _percentage(present, total)}
+
+
+def low_attendance(institution_id, threshold=75.0, since=None, until=None):
+    """(student, subject) pairs of an institution below threshold percent"""
+    present, total = func.sum(AttendanceRollup.present), func.sum(AttendanceRollup.total)
+    rows = _month_range(db.session.query(
+        User.college_id, User.name, AttendanceRollup.subject_id, Subject.name, present, total
+    ).join(
+        User, AttendanceRollup.student_id == User.id
+    ).join(
+        Subject, AttendanceRollup.subject_id == Subject.id
+    ).filter(
+        AttendanceRollup.institution_id == institution_id
+    ), since, until).group_by(
+        User.college_id, User.name, AttendanceRollup.subject_id, Subject.name
+    ).having(100 * present < threshold * total).all()
+
+    return sorted(
+        (
+            {
+                'college_id': college_id, 'name': name, 'subject_id': subject_id, 'subject': subject,
+                'present': int(present_count), 'total': int(total_count),
+                'percentage': _percentage(present_count, total_count)
+            }
+            for college_id, name, subject_id, subject, present_count, total_count in rows
+        ),
+        key=lambda row: row['percentage']
+    )
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Rebuild the attendance rollup counters")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--institution', type=int, help="default: every institution")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with create_app().app_context():
+        print(f"✅ {rebuild_rollups(args.institution)} rollup rows written")
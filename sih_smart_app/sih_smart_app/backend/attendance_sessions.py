@@ -0,0 +1,154 @@
+# File: backend/attendance_sessions.py
+"""
+Bitset storage of attendance (ATTENDANCE_STORAGE=bitset): one
+AttendanceSession row per class and day, holding bitmaps over a frozen
+AttendanceRoster of the class's students instead of one AttendanceRecord
+per student.
+"""
+
+import logging
+
+import numpy as np
+
+from models import db, AttendanceRecord, AttendanceRoster, AttendanceSession
+
+logger = logging.getLogger(__name__)
+
+
+def roster_ids(roster):
+    return np.frombuffer(roster.student_ids, dtype='<i4').astype(np.int64)
+
+
+def encode_bits(mask):
+    return np.packbits(np.asarray(mask, dtype=bool), bitorder='little').tobytes()
+
+
+def decode_bits(data, size):
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=size, bitorder='little').astype(bool)
+
+
+def roster_for(class_id, student_ids):
+    """The class's latest roster if it holds every given student, else a
+    new roster of its students plus the given ones. Rosters are never
+    changed, so bitmaps written against one stay readable."""
+    roster = AttendanceRoster.query.filter_by(class_id=class_id).order_by(AttendanceRoster.id.desc()).first()
+    current = roster_ids(roster) if roster is not None else np.zeros(0, dtype=np.int64)
+    wanted = np.asarray(sorted(student_ids), dtype=np.int64)
+    if roster is not None and np.isin(wanted, current).all():
+        return roster
+    ids = np.union1d(current, wanted)
+    roster = AttendanceRoster(class_id=class_id, size=len(ids), student_ids=ids.astype('<i4').tobytes())
+    db.session.add(roster)
+    db.session.flush()
+    return roster
+
+
+def session_statuses(session, roster=None):
+    """{student_id: 'present'/'absent'} of one stored session"""
+    roster = roster or db.session.get(AttendanceRoster, session.roster_id)
+    ids = roster_ids(roster)
+    present = decode_bits(session.present_bits, roster.size)
+    marked = decode_bits(session.marked_bits, roster.size)
+    return {int(student_id): 'present' if is_present else 'absent'
+            for student_id, is_present in zip(ids[marked], present[marked])}
+
+
+def write_session(class_id, day, statuses, timestamp):
+    """Store a session's complete {student_id: status} map as bitmaps"""
+    roster = roster_for(class_id, statuses)
+    ids = roster_ids(roster)
+    positions = np.searchsorted(ids, np.fromiter(statuses, dtype=np.int64, count=len(statuses)))
+    present = np.zeros(roster.size, dtype=bool)
+    marked = np.zeros(roster.size, dtype=bool)
+    marked[positions] = True
+    present[positions] = np.fromiter((status == 'present' for status in statuses.values()), dtype=bool, count=len(statuses))
+
+    session = AttendanceSession.query.filter_by(class_id=class_id, date=day).first()
+    if session is None:
+        session = AttendanceSession(class_id=class_id, date=day)
+        db.session.add(session)
+    session.roster_id = roster.id
+    session.present_bits = encode_bits(present)
+    session.marked_bits = encode_bits(marked)
+    session.timestamp = timestamp
+    return session
+
+
+def decode_sessions(sessions):
+    """Columnar view of many sessions: arrays of student_id, class_id, date
+    and present, one entry per marked student.
+
+    Sessions sharing a roster are unpacked together as one bit matrix.
+    """
+    by_roster = {}
+    for session in sessions:
+        by_roster.setdefault(session.roster_id, []).append(session)
+    rosters = {roster.id: roster for roster in AttendanceRoster.query.filter(AttendanceRoster.id.in_(list(by_roster)))} if by_roster else {}
+
+    columns = {'student_id': [], 'class_id': [], 'date': [], 'present': []}
+    for roster_id, group in by_roster.items():
+        roster = rosters[roster_id]
+        ids = roster_ids(roster)
+        width = (roster.size + 7) // 8
+        present = np.unpackbits(
+            np.frombuffer(b''.join(session.present_bits for session in group), dtype=np.uint8).reshape(len(group), width),
+            axis=1, count=roster.size, bitorder='little'
+        ).astype(bool)
+        marked = np.unpackbits(
+            np.frombuffer(b''.join(session.marked_bits for session in group), dtype=np.uint8).reshape(len(group), width),
+            axis=1, count=roster.size, bitorder='little'
+        ).astype(bool)
+        rows, positions = np.nonzero(marked)
+        columns['student_id'].append(ids[positions])
+        columns['class_id'].append(np.array([session.class_id for session in group], dtype=np.int64)[rows])
+        columns['date'].append(np.array([np.datetime64(session.date, 'D') for session in group])[rows])
+        columns['present'].append(present[rows, positions])
+
+    if not columns['student_id']:
+        return {
+            'student_id': np.zeros(0, dtype=np.int64), 'class_id': np.zeros(0, dtype=np.int64),
+            'date': np.zeros(0, dtype='datetime64[D]'), 'present': np.zeros(0, dtype=bool)
+        }
+    return {name: np.concatenate(parts) for name, parts in columns.items()}
+
+
+def _date_range(query, column, since, until):
+    if since is not None:
+        query = query.filter(column >= since)
+    if until is not None:
+        query = query.filter(column <= until)
+    return query
+
+
+def attendance_records(class_ids=None, student_id=None, since=None, until=None):
+    """Per-student records of both storage modes, as dicts shaped like
+    AttendanceRecord (student_id, class_id, date, status, timestamp).
+
+    Reports can read through this whatever ATTENDANCE_STORAGE is set to.
+    """
+    records = AttendanceRecord.query
+    sessions = AttendanceSession.query
+    if class_ids is not None:
+        records = records.filter(AttendanceRecord.class_id.in_(list(class_ids)))
+        sessions = sessions.filter(AttendanceSession.class_id.in_(list(class_ids)))
+    if student_id is not None:
+        records = records.filter(AttendanceRecord.student_id == student_id)
+    records = _date_range(records, AttendanceRecord.date, since, until)
+    sessions = _date_range(sessions, AttendanceSession.date, since, until)
+
+    for record in records.order_by(AttendanceRecord.date, AttendanceRecord.id).yield_per(1000):
+        yield {
+            'student_id': record.student_id, 'class_id': record.class_id, 'date': record.date,
+            'status': record.status, 'timestamp': record.timestamp
+        }
+
+    rosters = {}
+    for session in sessions.order_by(AttendanceSession.date, AttendanceSession.id).yield_per(1000):
+        if session.roster_id not in rosters:
+            rosters[session.roster_id] = db.session.get(AttendanceRoster, session.roster_id)
+        for record_student_id, status in session_statuses(session, rosters[session.roster_id]).items():
+            if student_id is None or record_student_id == student_id:
+                yield {
+                    'student_id': record_student_id, 'class_id': session.class_id, 'date': session.date,
+                    'status': status, 'timestamp': session.timestamp
+                }
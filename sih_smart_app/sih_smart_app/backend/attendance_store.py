@@ -0,0 +1,138 @@
+# File: backend/attendance_store.py
+import logging
+from datetime import datetime
+
+from models import db, User, ClassSchedule, AttendanceRecord, AttendanceRollup, AttendanceSession
+from attendance_sessions import session_statuses, write_session
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODES = ('rows', 'bitset')
+# Databases _upsert can write to
+UPSERT_DIALECTS = ('postgresql', 'sqlite', 'mysql', 'mariadb')
+
+
+def check_attendance_storage(storage, dialect):
+    """Fail at startup, not on the first save, on a storage mode or a
+    database attendance cannot be saved with"""
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown ATTENDANCE_STORAGE '{storage}' (expected one of {', '.join(STORAGE_MODES)})")
+    if dialect not in UPSERT_DIALECTS:
+        raise ValueError(f"Attendance cannot be saved on {dialect}; supported databases: {', '.join(UPSERT_DIALECTS)}")
+
+
+def _upsert(table, rows, keys, updates, increments=()):
+    """INSERT ... ON CONFLICT (keys) DO UPDATE for the databases we deploy on.
+
+    Columns in updates take the new row's value; columns in increments
+    are added to the stored value. The dialect is checked at startup
+    (check_attendance_storage).
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table).values(rows)
+        values = {column: statement.inserted[column] for column in updates}
+        values.update({column: table.c[column] + statement.inserted[column] for column in increments})
+        return statement.on_duplicate_key_update(values)
+    statement = insert(table).values(rows)
+    values = {column: statement.excluded[column] for column in updates}
+    values.update({column: table.c[column] + statement.excluded[column] for column in increments})
+    return statement.on_conflict_do_update(index_elements=keys, set_=values)
+
+
+def _rollup_deltas(institution_id, subject_id, day, statuses, previous):
+    """Counter changes for one session: a new record adds to total (and
+    present), a changed status moves one count between present and absent"""
+    month = day.replace(day=1)
+    deltas = []
+    for student_id, status in statuses.items():
+        before = previous.get(student_id)
+        present = (status == 'present') - (before == 'present')
+        total = 0 if before is not None else 1
+        if present or total:
+            deltas.append({
+                'institution_id': institution_id, 'student_id': student_id, 'subject_id': subject_id,
+                'month': month, 'present': present, 'total': total
+            })
+    return deltas
+
+
+def _stored_statuses(class_id, day):
+    """What is stored for a session so far, in either storage mode:
+    ({student_id: status} of its records, its AttendanceSession or None)"""
+    rows = dict(db.session.query(AttendanceRecord.student_id, AttendanceRecord.status).filter(
+        AttendanceRecord.class_id == class_id, AttendanceRecord.date == day
+    ).all())
+    session = AttendanceSession.query.filter_by(class_id=class_id, date=day).first()
+    return rows, session
+
+
+def save_attendance_records(institution_id, class_id, day, attendance_map, storage='rows'):
+    """Record one class session from a {college_id: present} map.
+
+    Students are resolved with a single IN query. With storage='rows' all
+    records are written in one upsert on (student_id, class_id, date);
+    with 'bitset' the whole session is one AttendanceSession row. Either
+    way saving the same session again only updates statuses, and a
+    session stored in the other mode is moved over. The students' rollup
+    counters change in the same transaction. Returns the number of
+    records written and the college IDs that matched no student; raises
+    ValueError when the class does not exist.
+    """
+    # Locking the class row serialises saves of its sessions, so two
+    # concurrent saves cannot both count the same record as new
+    subject_id = db.session.query(ClassSchedule.subject_id).join(
+        User, ClassSchedule.teacher_id == User.id
+    ).filter(
+        ClassSchedule.id == class_id, User.institution_id == institution_id
+    ).with_for_update(of=ClassSchedule).scalar()
+    if subject_id is None:
+        raise ValueError("Class not found")
+
+    students = dict(db.session.query(User.college_id, User.id).filter(
+        User.institution_id == institution_id,
+        User.college_id.in_(list(attendance_map))
+    ).all()) if attendance_map else {}
+    statuses = {
+        students[college_id]: 'present' if is_present else 'absent'
+        for college_id, is_present in attendance_map.items() if college_id in students
+    }
+
+    if statuses:
+        rows, session = _stored_statuses(class_id, day)
+        previous = {**(session_statuses(session) if session is not None else {}), **rows}
+        now = datetime.utcnow()
+        if storage == 'bitset':
+            write_session(class_id, day, {**previous, **statuses}, now)
+            if rows:
+                AttendanceRecord.query.filter_by(class_id=class_id, date=day).delete(synchronize_session=False)
+        else:
+            # Students only in a bitset session of this day become records too
+            written = {**{student_id: previous[student_id] for student_id in previous if student_id not in rows}, **statuses}
+            db.session.execute(_upsert(
+                AttendanceRecord.__table__,
+                [
+                    {'student_id': student_id, 'class_id': class_id, 'date': day, 'status': status, 'timestamp': now}
+                    for student_id, status in written.items()
+                ],
+                keys=['student_id', 'class_id', 'date'], updates=['status', 'timestamp']
+            ))
+            if session is not None:
+                db.session.delete(session)
+        deltas = _rollup_deltas(institution_id, subject_id, day, statuses, previous)
+        if deltas:
+            db.session.execute(_upsert(
+                AttendanceRollup.__table__, deltas,
+                keys=['student_id', 'subject_id', 'month'], updates=[], increments=['present', 'total']
+            ))
+    db.session.commit()
+
+    unknown = sorted(set(attendance_map) - set(students))
+    if unknown:
+        logger.warning(f"Attendance for class {class_id}: {len(unknown)} unknown college IDs")
+    return len(statuses), unknown
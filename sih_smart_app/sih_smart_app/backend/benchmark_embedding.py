@@ -0,0 +1,108 @@
+# File: backend/benchmark_embedding.py
+"""
+Benchmark face embedding throughput (faces per second) against batch size,
+as used for the crops of one classroom photo. Needs DeepFace and its model
+weights; runs on CPU unless TensorFlow finds a GPU.
+
+Run once per --backend (tensorflow, onnx) to compare per-face latency and
+the process's peak RSS.
+
+Usage: python benchmark_embedding.py --faces 60 --batch-sizes 1 8 16 32 64 --workers 1 2
+       python benchmark_embedding.py --backend onnx --onnx-threads 4
+       python benchmark_embedding.py --concurrent 16 --faces 4 --wait-ms 2 5 10
+"""
+
+import argparse
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from face_pipeline import embed_faces, warm_model, build_embedding_model, configure_embedding_backend, _forward_batch
+from embedding_batcher import EmbeddingBatcher
+
+
+def synthetic_crops(count, rng):
+    """Aligned-crop stand-ins of varying size, RGB in [0, 1] like DeepFace returns"""
+    crops = []
+    for _ in range(count):
+        side = int(rng.integers(40, 200))
+        crops.append({'face': rng.random((side, side, 3), dtype=np.float32)})
+    return crops
+
+
+def run_benchmark(model_name, faces_count, batch_sizes, workers_options, repeats, seed):
+    rng = np.random.default_rng(seed)
+    crops = synthetic_crops(faces_count, rng)
+    warm_model(model_name, Config.FACE_DETECTOR_BACKEND)
+
+    print(f"model={model_name} faces={faces_count}")
+    print(f"{'batch':>6} {'workers':>8} {'seconds':>9} {'faces/s':>9} {'ms/face':>8} {'speedup':>8}")
+    baseline = None
+    for workers in workers_options:
+        for batch_size in batch_sizes:
+            embed_faces(crops[:batch_size], model_name, batch_size=batch_size)  # trace this batch shape
+            start = time.perf_counter()
+            for _ in range(repeats):
+                embed_faces(crops, model_name, batch_size=batch_size, workers=workers)
+            seconds = (time.perf_counter() - start) / repeats
+            rate = faces_count / seconds
+            baseline = baseline or rate
+            print(f"{batch_size:>6} {workers:>8} {seconds:>9.3f} {rate:>9.1f} {1000 / rate:>8.2f} {rate / baseline:>7.1f}x")
+
+
+def run_concurrency_benchmark(model_name, requests, faces_per_request, max_batch_size, waits_ms, seed):
+    """Many concurrent requests with a few faces each (the morning rush),
+    embedded per request and through the micro-batcher"""
+    rng = np.random.default_rng(seed)
+    crops = [synthetic_crops(faces_per_request, rng) for _ in range(requests)]
+    warm_model(model_name, Config.FACE_DETECTOR_BACKEND)
+    model = build_embedding_model(model_name)
+
+    def timed_request(batcher):
+        def run(request_crops):
+            start = time.perf_counter()
+            embed_faces(request_crops, model_name, batcher=batcher)
+            return time.perf_counter() - start
+        return run
+
+    print(f"model={model_name} concurrent requests={requests} faces/request={faces_per_request}")
+    print(f"{'mode':>14} {'seconds':>9} {'faces/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'crops/batch':>12}")
+    modes = [('per-request', None)] + [
+        (f"batched/{wait}ms", EmbeddingBatcher(lambda batch: _forward_batch(model, batch), max_batch_size, wait))
+        for wait in waits_ms
+    ]
+    for label, batcher in modes:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            latencies = np.array(list(pool.map(timed_request(batcher), crops)))
+        seconds = time.perf_counter() - start
+        per_batch = batcher.stats()['avg_batch_crops'] if batcher else faces_per_request
+        print(f"{label:>14} {seconds:>9.3f} {requests * faces_per_request / seconds:>9.1f} "
+              f"{1000 * np.percentile(latencies, 50):>8.0f} {1000 * np.percentile(latencies, 95):>8.0f} {per_batch:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched face embedding")
+    parser.add_argument('--model', default=Config.FACE_MODEL_NAME)
+    parser.add_argument('--faces', type=int, default=60, help="faces in one classroom photo")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrent', type=int, default=0,
+                        help="simulate this many simultaneous requests of --faces faces each, with and without micro-batching")
+    parser.add_argument('--max-batch', type=int, default=Config.FACE_MICROBATCH_MAX_SIZE)
+    parser.add_argument('--wait-ms', type=float, nargs='+', default=[Config.FACE_MICROBATCH_WAIT_MS])
+    parser.add_argument('--backend', choices=['tensorflow', 'onnx'], default=Config.FACE_EMBED_BACKEND)
+    parser.add_argument('--onnx-threads', type=int, default=Config.FACE_ONNX_THREADS)
+    args = parser.parse_args()
+    configure_embedding_backend(args.backend, Config.FACE_ONNX_DIR, args.onnx_threads)
+    print(f"backend={args.backend}")
+    if args.concurrent:
+        run_concurrency_benchmark(args.model, args.concurrent, args.faces, args.max_batch, args.wait_ms, args.seed)
+    else:
+        run_benchmark(args.model, args.faces, args.batch_sizes, args.workers, args.repeats, args.seed)
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
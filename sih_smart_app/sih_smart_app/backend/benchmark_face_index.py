@@ -0,0 +1,106 @@
+# File: backend/benchmark_face_index.py
+"""
+Benchmark approximate (IVF) and compact (float16/int8 with float32
+re-ranking) face search against exact search on synthetic galleries.
+Searches go through FaceIndex.match scoped to one institution, as in
+the attendance endpoints. Reports recall@1, per-query latency and the
+gallery bytes scanned in memory.
+
+Usage: python benchmark_face_index.py --sizes 10000 100000 500000 --nprobe 4 8 16
+       python benchmark_face_index.py --precision float16 int8 --rerank-k 8 16
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from face_index import FaceIndex, IVFFaceIndex, normalize_rows
+
+
+def synthetic_gallery(size, dim, samples_per_student, noise, rng):
+    """Enrolled samples clustered around one random centre per student"""
+    students = max(size // samples_per_student, 1)
+    centres = normalize_rows(rng.standard_normal((students, dim), dtype=np.float32))
+    owners = np.repeat(np.arange(students), samples_per_student)[:size]
+    gallery = centres[owners] + noise * rng.standard_normal((size, dim), dtype=np.float32) / np.sqrt(dim)
+    return gallery, owners, centres
+
+
+def institutions_of(owners, share):
+    """Institution 1 enrolls the first `share` of the students, institution 2 the rest"""
+    return np.where(owners < share * (owners.max() + 1), 1, 2)
+
+
+def timed_search(index, queries, batch_size, institution_id=1):
+    """Match in attendance-photo sized batches the way the app does, scoped
+    to one institution; returns the matched labels and ms per query"""
+    labels = []
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        matches = index.match(queries[offset:offset + batch_size], 2.0, institution_id=institution_id)
+        labels.extend(label for label, _ in matches)
+    elapsed = time.perf_counter() - start
+    return np.array(labels, dtype=object), 1000 * elapsed / len(queries)
+
+
+def run_benchmark(sizes, dim, nprobes, nlist, queries_count, batch_size, precisions, rerank_ks, seed, share=0.5):
+    rng = np.random.default_rng(seed)
+    print(f"{'gallery':>9} {'index':>12} {'build s':>8} {'ms/query':>9} {'recall@1':>9} {'MB':>8}")
+    for size in sizes:
+        gallery, owners, centres = synthetic_gallery(size, dim, 4, 0.6, rng)
+        # One label per sample, so recall compares the exact nearest sample
+        # (IVF training reorders rows)
+        labels = [f"S{owner}/{row}" for row, owner in enumerate(owners)]
+        institutions = institutions_of(owners, share)
+        # Queries are fresh photos of students enrolled in institution 1
+        picked = rng.choice(int(np.ceil(share * len(centres))), size=queries_count)
+        queries = centres[picked] + 0.6 * rng.standard_normal((queries_count, dim), dtype=np.float32) / np.sqrt(dim)
+
+        start = time.perf_counter()
+        exact = FaceIndex(gallery, labels, institution_ids=institutions)
+        build = time.perf_counter() - start
+        truth, exact_ms = timed_search(exact, queries, batch_size)
+        print(f"{size:>9} {'exact':>12} {build:>8.2f} {exact_ms:>9.3f} {1.0:>9.3f} {exact.gallery_bytes() / 1e6:>8.1f}")
+        del exact
+
+        for precision in precisions:
+            start = time.perf_counter()
+            compact = FaceIndex(gallery, labels, institution_ids=institutions, precision=precision)
+            build = time.perf_counter() - start
+            for rerank_k in rerank_ks:
+                compact.rerank_k = rerank_k
+                found, compact_ms = timed_search(compact, queries, batch_size)
+                recall = float(np.mean(found == truth))
+                print(f"{size:>9} {f'{precision}/{rerank_k}':>12} {build:>8.2f} {compact_ms:>9.3f} {recall:>9.3f} "
+                      f"{compact.gallery_bytes() / 1e6:>8.1f}")
+            del compact
+
+        start = time.perf_counter()
+        ivf = IVFFaceIndex(gallery, labels, institution_ids=institutions, nlist=nlist)
+        build = time.perf_counter() - start
+        for nprobe in nprobes:
+            ivf.nprobe = nprobe
+            found, ivf_ms = timed_search(ivf, queries, batch_size)
+            recall = float(np.mean(found == truth))
+            print(f"{size:>9} {f'ivf/{nprobe}':>12} {build:>8.2f} {ivf_ms:>9.3f} {recall:>9.3f} {ivf.gallery_bytes() / 1e6:>8.1f}")
+        del ivf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark IVF face search against exact search")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--dim', type=int, default=512,
+                        help="embedding size (VGG-Face is 4096; 500k x 4096 needs ~16 GB RAM)")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--nlist', type=int, default=0, help="0 = sqrt(gallery size)")
+    parser.add_argument('--queries', type=int, default=600)
+    parser.add_argument('--batch-size', type=int, default=60, help="faces per attendance photo")
+    parser.add_argument('--precision', nargs='*', default=['float16', 'int8'], choices=['float16', 'int8'])
+    parser.add_argument('--rerank-k', type=int, nargs='+', default=[16])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--share', type=float, default=0.5,
+                        help="fraction of the gallery enrolled in the institution being matched")
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.dim, args.nprobe, args.nlist, args.queries, args.batch_size,
+                  args.precision, args.rerank_k, args.seed, args.share)
@@ -7,4 +7,70 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-very-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Face Recognition
+    KNOWN_FACES_DIR = os.environ.get('KNOWN_FACES_DIR') or 'known_faces'
+    FACE_SAMPLES_DIR = os.environ.get('FACE_SAMPLES_DIR') or 'face_samples'  # enrollment photos, kept for re-indexing
+    FACE_MODEL_NAME = os.environ.get('FACE_MODEL_NAME') or 'VGG-Face'
+    FACE_DETECTOR_BACKEND = os.environ.get('FACE_DETECTOR_BACKEND') or 'opencv'
+    # Detector cascade: re-detect weak tiles of attendance photos with a slower, more sensitive detector
+    FACE_CASCADE_DETECTOR = os.environ.get('FACE_CASCADE_DETECTOR') or ''  # e.g. 'retinaface'; empty = off
+    FACE_CASCADE_GRID = int(os.environ.get('FACE_CASCADE_GRID') or 2)  # photo split into grid x grid tiles
+    FACE_CASCADE_MIN_CONFIDENCE = float(os.environ.get('FACE_CASCADE_MIN_CONFIDENCE') or 0.9)  # weaker boxes escalate their tile
+    FACE_CASCADE_ROSTER_RATIO = float(os.environ.get('FACE_CASCADE_ROSTER_RATIO') or 0.9)  # fewer faces than this x roster escalates all tiles
+    FACE_DISTANCE_THRESHOLD = float(os.environ.get('FACE_DISTANCE_THRESHOLD') or 0.68)  # cosine distance
+    FACE_INDEX_REFRESH_SECONDS = int(os.environ.get('FACE_INDEX_REFRESH_SECONDS') or 10)  # poll for new enrollments
+    MAX_FACE_SAMPLES = 10
+    # Quality gate: faces failing any check are reported instead of embedded
+    FACE_QUALITY_GATE = os.environ.get('FACE_QUALITY_GATE', 'true').lower() == 'true'
+    FACE_MIN_SIZE = int(os.environ.get('FACE_MIN_SIZE') or 32)  # px, shorter side of the box
+    FACE_MIN_SHARPNESS = float(os.environ.get('FACE_MIN_SHARPNESS') or 40)  # Laplacian variance of a 64 px gray crop
+    FACE_MAX_POSE_OFFSET = float(os.environ.get('FACE_MAX_POSE_OFFSET') or 0.2)  # eye midpoint off-centre, x box width
+    FACE_MIN_CONFIDENCE = float(os.environ.get('FACE_MIN_CONFIDENCE') or 0)  # detector score; scale depends on the detector
+    MAX_ATTENDANCE_PHOTOS = int(os.environ.get('MAX_ATTENDANCE_PHOTOS') or 6)  # frames fused per request
+    ATTENDANCE_VIDEO_SAMPLE_FPS = float(os.environ.get('ATTENDANCE_VIDEO_SAMPLE_FPS') or 2)  # frames run through the detector per second
+    ATTENDANCE_VIDEO_MAX_SECONDS = int(os.environ.get('ATTENDANCE_VIDEO_MAX_SECONDS') or 30)  # longer clips are cut off
+    ATTENDANCE_VIDEO_CROPS_PER_TRACK = int(os.environ.get('ATTENDANCE_VIDEO_CROPS_PER_TRACK') or 3)  # averaged per face track
+    FACE_MAX_IMAGE_DIMENSION = int(os.environ.get('FACE_MAX_IMAGE_DIMENSION') or 1600)  # px, longest side
+    ATTENDANCE_AUDIT_UPLOADS = os.environ.get('ATTENDANCE_AUDIT_UPLOADS', 'false').lower() == 'true'  # keep photos in uploads/
+    FACE_EMBED_BATCH_SIZE = int(os.environ.get('FACE_EMBED_BATCH_SIZE') or 32)  # crops per forward pass
+    FACE_EMBED_WORKERS = int(os.environ.get('FACE_EMBED_WORKERS') or 1)  # threads for photos with several batches
+    FACE_EMBED_BACKEND = os.environ.get('FACE_EMBED_BACKEND') or 'tensorflow'  # or 'onnx' (see onnx_backend.py)
+    FACE_ONNX_DIR = os.environ.get('FACE_ONNX_DIR') or 'onnx_models'
+    FACE_ONNX_THREADS = int(os.environ.get('FACE_ONNX_THREADS') or 0)  # intra-op threads per worker; 0 = all cores
+    # Micro-batching: crops of concurrent requests (threaded workers) share forward passes
+    FACE_MICROBATCH = os.environ.get('FACE_MICROBATCH', 'false').lower() == 'true'
+    FACE_MICROBATCH_MAX_SIZE = int(os.environ.get('FACE_MICROBATCH_MAX_SIZE') or 64)  # crops per forward pass
+    FACE_MICROBATCH_WAIT_MS = float(os.environ.get('FACE_MICROBATCH_WAIT_MS') or 5)  # how long a batch stays open
+    FACE_WARMUP = os.environ.get('FACE_WARMUP') or 'lazy'  # 'eager' = load the model when the worker boots
+    STAGE_TIMING_HEADER = os.environ.get('STAGE_TIMING_HEADER', 'false').lower() == 'true'  # Server-Timing on recognition responses
+    ATTENDANCE_CACHE_SIZE = int(os.environ.get('ATTENDANCE_CACHE_SIZE') or 256)  # results per worker, 0 = off
+    ATTENDANCE_CACHE_TTL = int(os.environ.get('ATTENDANCE_CACHE_TTL') or 900)  # seconds
+
+    # Background Recognition Jobs (per web worker)
+    ATTENDANCE_JOB_WORKERS = int(os.environ.get('ATTENDANCE_JOB_WORKERS') or 1)  # pool processes per web worker
+    ATTENDANCE_JOB_QUEUE_SIZE = int(os.environ.get('ATTENDANCE_JOB_QUEUE_SIZE') or 16)  # reject beyond this
+    ATTENDANCE_JOB_MAX_WAIT = 30  # longest long-poll, in seconds
+    ATTENDANCE_JOB_RETENTION_HOURS = 24
+    # 'rows': one AttendanceRecord per student; 'bitset': one AttendanceSession bitmap per class session
+    ATTENDANCE_STORAGE = os.environ.get('ATTENDANCE_STORAGE') or 'rows'
+    # Semester analytics (see attendance_analytics.py), cached per institution in every web worker
+    SEMESTER_START = os.environ.get('SEMESTER_START')  # YYYY-MM-DD; default 1 January / 1 July
+    ANALYTICS_AT_RISK_THRESHOLD = float(os.environ.get('ANALYTICS_AT_RISK_THRESHOLD') or 75)  # percent, in any subject
+    ANALYTICS_REFRESH_SECONDS = int(os.environ.get('ANALYTICS_REFRESH_SECONDS') or 60)  # how often to look for new sessions
+    ANALYTICS_RELOAD_HOURS = int(os.environ.get('ANALYTICS_RELOAD_HOURS') or 24)  # full reload, drops deleted data
+
+    # Face Index: 'exact' brute force or 'ivf' approximate search for large galleries
+    FACE_INDEX_TYPE = os.environ.get('FACE_INDEX_TYPE') or 'exact'
+    FACE_IVF_NLIST = int(os.environ.get('FACE_IVF_NLIST') or 0)  # 0 = sqrt(gallery size)
+    FACE_IVF_NPROBE = int(os.environ.get('FACE_IVF_NPROBE') or 8)  # higher = better recall, slower
+    # Exact index only: 'float16' / 'int8' scan compact codes and re-rank the top candidates in float32
+    FACE_GALLERY_PRECISION = os.environ.get('FACE_GALLERY_PRECISION') or 'float32'
+    FACE_RERANK_K = int(os.environ.get('FACE_RERANK_K') or 16)  # candidates per face re-scored exactly
+    FACE_GALLERY_EXPORT_DIR = os.environ.get('FACE_GALLERY_EXPORT_DIR') or 'face_gallery'  # see face_store.py
+    # Duplicate-face audit (see face_audit.py)
+    FACE_AUDIT_DISTANCE_THRESHOLD = float(os.environ.get('FACE_AUDIT_DISTANCE_THRESHOLD') or 0.3)  # stricter than matching
+    FACE_AUDIT_TILE_SIZE = int(os.environ.get('FACE_AUDIT_TILE_SIZE') or 2048)  # rows per block of the similarity matrix
+    FACE_AUDIT_WORKERS = int(os.environ.get('FACE_AUDIT_WORKERS') or 0)  # 0 = every core
+    FACE_AUDIT_MAX_PAIRS = int(os.environ.get('FACE_AUDIT_MAX_PAIRS') or 1000)  # closest pairs kept per audit
@@ -0,0 +1,245 @@
+# File: backend/db_indexes.py
+"""
+Indexes and uniqueness constraints on the hot lookup paths, for databases
+created before they were declared in models.py, plus a query-plan check
+that fails if any hot query falls back to a full table scan.
+
+Usage: python db_indexes.py upgrade [--database-url URL]
+       python db_indexes.py downgrade [--database-url URL]
+       python db_indexes.py check [--rows 1000000] [--database-url URL]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from datetime import date, time as day_time, timedelta
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from models import db, User, Institution, ClassSchedule, AttendanceRecord
+
+logger = logging.getLogger(__name__)
+
+# (table, name, columns, unique), as declared in models.py
+HOT_PATH_INDEXES = [
+    ('user', 'uq_user_college_institution', ('college_id', 'institution_id'), True),
+    ('user', 'ix_user_section_id', ('section_id',), False),
+    ('attendance_record', 'uq_attendance_student_class_date', ('student_id', 'class_id', 'date'), True),
+    ('attendance_record', 'ix_attendance_student_date', ('student_id', 'date'), False),
+    ('attendance_record', 'ix_attendance_class_date', ('class_id', 'date'), False),
+    ('attendance_record', 'ix_attendance_timestamp', ('timestamp',), False),
+    ('attendance_session', 'ix_session_timestamp', ('timestamp',), False),
+    ('class_schedule', 'ix_schedule_teacher_day', ('teacher_id', 'day_of_week'), False),
+    ('class_schedule', 'ix_schedule_section_day', ('section_id', 'day_of_week'), False),
+]
+
+
+def _existing_indexes(inspector, table):
+    """Names and column lists of a table's indexes and unique constraints"""
+    found = inspector.get_indexes(table) + inspector.get_unique_constraints(table)
+    return {entry['name'] for entry in found}, {tuple(entry['column_names']) for entry in found}
+
+
+def _missing_indexes(inspector):
+    for table, name, columns, unique in HOT_PATH_INDEXES:
+        if not inspector.has_table(table) or not set(columns) <= {column['name'] for column in inspector.get_columns(table)}:
+            # Tables and columns newer than the database get their indexes with them (flask db upgrade)
+            logger.warning(f"Skipping {name}: {table}{columns} does not exist yet; run the schema migrations first")
+            continue
+        names, covered = _existing_indexes(inspector, table)
+        if name not in names and columns not in covered:
+            yield table, name, columns, unique
+
+
+def duplicate_groups(engine, table, columns):
+    """Number of value groups that occur more than once in the columns"""
+    quote = engine.dialect.identifier_preparer.quote
+    quoted = ', '.join(quote(column) for column in columns)
+    with engine.connect() as connection:
+        return connection.execute(text(
+            f"SELECT COUNT(*) FROM (SELECT {quoted} FROM {quote(table)} "
+            f"GROUP BY {quoted} HAVING COUNT(*) > 1) AS duplicates"
+        )).scalar()
+
+
+def upgrade(engine):
+    """Create the missing indexes. Uniqueness is added as unique indexes,
+    which every backend can add to an existing table.
+
+    Raises ValueError, before creating anything, if a table holds rows
+    a new unique index would reject.
+    """
+    inspector = inspect(engine)
+    missing = list(_missing_indexes(inspector))
+    for table, name, columns, unique in missing:
+        if unique:
+            groups = duplicate_groups(engine, table, columns)
+            if groups:
+                raise ValueError(f"{table} has {groups} duplicated {columns} groups; remove them before creating {name}")
+    created = []
+    with engine.begin() as connection:
+        for table, name, columns, unique in missing:
+            quoted = ', '.join(engine.dialect.identifier_preparer.quote(column) for column in columns)
+            connection.execute(text(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} "
+                f"ON {engine.dialect.identifier_preparer.quote(table)} ({quoted})"
+            ))
+            created.append(name)
+            logger.info(f"Created index {name} on {table}{columns}")
+        if created and engine.dialect.name in ('sqlite', 'postgresql'):
+            # Refresh planner statistics so the new indexes are considered
+            connection.execute(text('ANALYZE'))
+    return created
+
+
+def downgrade(engine):
+    """Drop the indexes created by upgrade()"""
+    inspector = inspect(engine)
+    dropped = []
+    with engine.begin() as connection:
+        for table, name, _, _ in HOT_PATH_INDEXES:
+            if not inspector.has_table(table):
+                continue
+            # Indexes backing a declared constraint belong to the table definition, not to upgrade()
+            plain = {entry['name'] for entry in inspector.get_indexes(table) if not entry.get('duplicates_constraint')}
+            if name in plain:
+                on_table = f" ON {engine.dialect.identifier_preparer.quote(table)}" if engine.dialect.name in ('mysql', 'mariadb') else ''
+                connection.execute(text(f"DROP INDEX {name}{on_table}"))
+                dropped.append(name)
+    return dropped
+
+
+# ---------- Query-plan check ----------
+def hot_queries(today):
+    """The lookups the app runs on every login, upload, attendance save and
+    analytics refresh"""
+    week_ago = (today - timedelta(days=7)).isoformat()
+    return {
+        'login': select(User.id).where(User.college_id == 'S000042'),
+        'student_by_college_id': select(User.id).where(User.institution_id == 1, User.college_id.in_(['S000042', 'S000043'])),
+        'section_roster': select(User.college_id).where(User.section_id == 3, User.role == 'student'),
+        'student_attendance': select(AttendanceRecord.status).where(
+            AttendanceRecord.student_id == 42, AttendanceRecord.date >= week_ago
+        ),
+        'class_attendance': select(AttendanceRecord.student_id).where(
+            AttendanceRecord.class_id == 7, AttendanceRecord.date == today.isoformat()
+        ),
+        'recently_saved': select(AttendanceRecord.class_id, AttendanceRecord.date).where(
+            AttendanceRecord.timestamp >= (today - timedelta(days=1)).isoformat()
+        ),
+        'teacher_timetable': select(ClassSchedule.id).where(ClassSchedule.teacher_id == 5, ClassSchedule.day_of_week == 2),
+        'section_timetable': select(ClassSchedule.id).where(ClassSchedule.section_id == 3, ClassSchedule.day_of_week == 2),
+    }
+
+
+def seed(engine, rows, students=5000, classes_per_section=10, section_size=125):
+    """Fill an empty schema with an institution whose attendance table
+    holds `rows` records (students x classes x days)"""
+    db.metadata.create_all(engine)
+    sections = students // section_size
+    days = max(rows // (students * classes_per_section), 1)
+    first_day = date.today() - timedelta(days=days)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(Institution.__table__.insert(), [{'id': 1, 'name': 'Seed', 'registration_code': 'SEED'}])
+        # An executemany takes its columns from the first row, so every row lists the same keys
+        connection.execute(User.__table__.insert(), [
+            {'id': teacher, 'college_id': f"T{teacher:06d}", 'password_hash': '-', 'name': 'Teacher',
+             'role': 'teacher', 'institution_id': 1, 'section_id': None}
+            for teacher in range(1, 101)
+        ] + [
+            {'id': 1000 + student, 'college_id': f"S{student:06d}", 'password_hash': '-', 'name': 'Student',
+             'role': 'student', 'institution_id': 1, 'section_id': student // section_size}
+            for student in range(students)
+        ])
+        connection.execute(ClassSchedule.__table__.insert(), [
+            {'id': section * classes_per_section + slot + 1, 'subject_id': slot + 1,
+             'teacher_id': (section * classes_per_section + slot) % 100 + 1, 'section_id': section,
+             'day_of_week': slot % 5, 'start_time': day_time(8 + (section * classes_per_section + slot) // 100, 0),
+             'end_time': day_time(9, 0)}
+            for section in range(sections) for slot in range(classes_per_section)
+        ])
+        batch = []
+        for day in range(days):
+            current = first_day + timedelta(days=day)
+            for student in range(students):
+                for slot in range(classes_per_section):
+                    batch.append({
+                        'student_id': 1000 + student, 'class_id': (student // section_size) * classes_per_section + slot + 1,
+                        'date': current, 'status': 'present' if (student + slot + day) % 5 else 'absent'
+                    })
+            if len(batch) >= 100000 or day == days - 1:
+                connection.execute(AttendanceRecord.__table__.insert(), batch)
+                batch = []
+        connection.execute(text('ANALYZE'))
+    logger.info(f"Seeded {days * students * classes_per_section} attendance records in {time.perf_counter() - started:.0f}s")
+
+
+def full_scans(engine, today=None):
+    """Hot queries whose plan reads a whole table: {name: plan}.
+    Understands SQLite and PostgreSQL plans."""
+    today = today or date.today()
+    failures = {}
+    with engine.connect() as connection:
+        for name, statement in hot_queries(today).items():
+            # Values are inlined, as a planner sees them in a real request
+            compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+            if engine.dialect.name == 'sqlite':
+                plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+                # "SCAN t" reads the table, "SCAN t USING COVERING INDEX" reads a whole index; SEARCH is a seek
+                scanning = [step for step in plan if step.startswith('SCAN ')]
+            else:
+                plan = [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {compiled}")]
+                scanning = [step for step in plan if 'Seq Scan' in step]
+            logger.info(f"{name}: {' | '.join(str(step).strip() for step in plan)}")
+            if scanning:
+                failures[name] = plan
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-path indexes: migrate and check query plans")
+    parser.add_argument('command', choices=['upgrade', 'downgrade', 'check'])
+    parser.add_argument('--database-url', help="default: the app's database (check: a fresh seeded SQLite file)")
+    parser.add_argument('--rows', type=int, default=1000000, help="attendance records seeded for check")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command != 'check':
+        if args.database_url:
+            engine = create_engine(args.database_url)
+        else:
+            # The app's own engine: Flask-SQLAlchemy puts a relative SQLite path under instance/
+            from app import create_app
+            with create_app().app_context():
+                engine = db.engine
+        try:
+            changed = upgrade(engine) if args.command == 'upgrade' else downgrade(engine)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ {args.command}: {', '.join(changed) or 'nothing to do'}")
+        sys.exit(0)
+
+    seeded_path = None
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        handle, seeded_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        engine = create_engine(f"sqlite:///{seeded_path}")
+        seed(engine, args.rows)
+    try:
+        failures = full_scans(engine)
+    finally:
+        engine.dispose()
+        if seeded_path:
+            os.remove(seeded_path)
+    for name, plan in failures.items():
+        print(f"❌ {name} scans a whole table: {plan}")
+    if not failures:
+        print(f"✅ All {len(hot_queries(date.today()))} hot queries use an index")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,134 @@
+# File: backend/embedding_batcher.py
+import time
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from face_pipeline import build_embedding_model, _forward_batch
+from metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Runs the preprocessed crops of concurrent requests through the model together.
+
+    The first waiting request opens a batch; crops of requests arriving
+    within max_wait_ms join it until max_batch_size is reached. One
+    background thread owns the model, and every caller blocks until its
+    own rows of the output are handed back.
+    """
+
+    def __init__(self, forward, max_batch_size=64, max_wait_ms=5):
+        self.forward = forward
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'batches': 0, 'crops': 0}
+
+    def embed(self, tensor):
+        """Embed one request's preprocessed crops; blocks until they are done"""
+        if len(tensor) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        self._ensure_thread()
+        request = {'tensor': tensor, 'queued': time.perf_counter(), 'done': threading.Event()}
+        self._queue.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['embeddings']
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        """Block for the first request, then gather others until the batch is full or the wait is over"""
+        pending = [self._queue.get()]
+        size = len(pending[0]['tensor'])
+        deadline = pending[0]['queued'] + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request['tensor'])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            started = time.perf_counter()
+            try:
+                batch = np.concatenate([request['tensor'] for request in pending])
+                outputs = np.concatenate([
+                    self.forward(batch[start:start + self.max_batch_size]).reshape(min(self.max_batch_size, len(batch) - start), -1)
+                    for start in range(0, len(batch), self.max_batch_size)
+                ])
+                offsets = np.cumsum([len(request['tensor']) for request in pending])[:-1]
+                for request, embeddings in zip(pending, np.split(outputs, offsets)):
+                    request['embeddings'] = embeddings
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(pending)} requests failed: {e}")
+                for request in pending:
+                    request['error'] = e
+
+            finished = time.perf_counter()
+            observe_stage('embedding_batcher.forward', 1000 * (finished - started))
+            with self._lock:
+                self.counters['requests'] += len(pending)
+                self.counters['batches'] += 1
+                self.counters['crops'] += sum(len(request['tensor']) for request in pending)
+            for request in pending:
+                observe_stage('embedding_batcher.wait', 1000 * (started - request['queued']))
+                request['done'].set()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        batches = counters['batches']
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': round(1000 * self.max_wait, 2),
+            'queue_depth': self._queue.qsize(),
+            'counters': counters,
+            'avg_batch_crops': round(counters['crops'] / batches, 2) if batches else None,
+            'avg_batch_requests': round(counters['requests'] / batches, 2) if batches else None
+        }
+
+
+# One batcher (and model-owning thread) per process
+_embedding_batcher = None
+_embedding_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher(app):
+    """The process's micro-batcher, or None when FACE_MICROBATCH is off"""
+    global _embedding_batcher
+    if not app.config['FACE_MICROBATCH']:
+        return None
+    if _embedding_batcher is None:
+        with _embedding_batcher_lock:
+            if _embedding_batcher is None:
+                model_name = app.config['FACE_MODEL_NAME']
+                _embedding_batcher = EmbeddingBatcher(
+                    lambda batch: _forward_batch(build_embedding_model(model_name), batch),
+                    max_batch_size=app.config['FACE_MICROBATCH_MAX_SIZE'],
+                    max_wait_ms=app.config['FACE_MICROBATCH_WAIT_MS']
+                )
+    return _embedding_batcher
+
+
+def embedding_batcher_stats():
+    return _embedding_batcher.stats() if _embedding_batcher is not None else None
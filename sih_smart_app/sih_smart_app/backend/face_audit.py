@@ -0,0 +1,211 @@
+# File: backend/face_audit.py
+"""
+Audit an institution's enrolled gallery for the same face enrolled under
+two college IDs (proxy enrollment or a data-entry mix-up).
+
+Usage: python face_audit.py --institution 1 [--threshold 0.3]
+       python face_audit.py --synthetic 100000 [--dimension 4096]   # timing only
+"""
+
+import os
+import time
+import uuid
+import logging
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from models import db, User, FaceAuditJob
+from face_index import load_face_index, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def _tile(embeddings, rows, start, stop):
+    if rows is None:
+        return np.asarray(embeddings[start:stop], dtype=np.float32)
+    return np.asarray(embeddings[rows[start:stop]], dtype=np.float32)
+
+
+def _scan_tile_row(embeddings, rows, codes, start, tile_size, min_similarity):
+    """Compare one tile of rows with itself and every later tile.
+
+    Only one tile_size x tile_size block of similarities exists at a time.
+    Returns {(code_a, code_b): [best similarity, matching sample pairs]}.
+    """
+    count = len(codes)
+    left = _tile(embeddings, rows, start, start + tile_size)
+    left_codes = codes[start:start + tile_size]
+    pairs = {}
+    for other in range(start, count, tile_size):
+        right = left if other == start else _tile(embeddings, rows, other, other + tile_size)
+        similarities = left @ right.T
+        hit_left, hit_right = np.nonzero(similarities >= min_similarity)
+        if other == start:
+            # Each pair once, and never a sample with itself
+            upper = hit_right > hit_left
+            hit_left, hit_right = hit_left[upper], hit_right[upper]
+        if not len(hit_left):
+            continue
+        code_a, code_b = left_codes[hit_left], codes[other + hit_right]
+        different = code_a != code_b
+        for a, b, score in zip(code_a[different], code_b[different], similarities[hit_left, hit_right][different]):
+            key = (a, b) if a < b else (b, a)
+            found = pairs.setdefault(key, [0.0, 0])
+            found[0] = max(found[0], float(score))
+            found[1] += 1
+    return pairs
+
+
+def find_duplicate_faces(embeddings, college_ids, distance_threshold=0.3, rows=None, tile_size=2048, workers=None):
+    """Pairs of college IDs with samples closer than distance_threshold.
+
+    The all-pairs similarity matrix is computed tile by tile (a blocked
+    matrix multiply), with tiles of rows spread over worker threads; NumPy
+    releases the GIL inside the multiply, so every core is used while
+    memory stays at a few tiles per thread. embeddings must be
+    L2-normalised; rows selects a subset of them without copying the rest.
+    """
+    college_ids = np.asarray(college_ids, dtype=object)
+    if rows is not None:
+        college_ids = college_ids[rows]
+    if len(college_ids) < 2:
+        return []
+    labels, codes = np.unique(college_ids.astype(str), return_inverse=True)
+    min_similarity = 1.0 - distance_threshold
+    workers = workers or os.cpu_count() or 1
+
+    merged = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_scan_tile_row, embeddings, rows, codes, start, tile_size, min_similarity)
+            for start in range(0, len(codes), tile_size)
+        ]
+        for future in futures:
+            for key, (score, samples) in future.result().items():
+                found = merged.setdefault(key, [0.0, 0])
+                found[0] = max(found[0], score)
+                found[1] += samples
+
+    duplicates = [
+        {
+            'college_id_a': labels[a],
+            'college_id_b': labels[b],
+            'distance': round(1.0 - score, 4),
+            'matching_samples': samples
+        }
+        for (a, b), (score, samples) in merged.items()
+    ]
+    return sorted(duplicates, key=lambda pair: pair['distance'])
+
+
+def audit_institution_gallery(app, institution_id, distance_threshold, tile_size=2048, workers=None):
+    """Run the duplicate audit over the gallery an institution is matched
+    against (its own samples plus legacy ones). Needs an app context."""
+    index = load_face_index(app, institution_id)
+    owners = index.institution_ids
+    rows = np.flatnonzero((owners == institution_id) | (owners == -1))
+    if len(rows) == len(index):
+        rows = None
+    duplicates = find_duplicate_faces(
+        index.embeddings, index.college_ids, distance_threshold, rows=rows, tile_size=tile_size, workers=workers
+    )
+    return duplicates, len(index) if rows is None else len(rows)
+
+
+# ---------- Background jobs ----------
+# One audit at a time per worker process; each already uses every core
+_audit_lock = threading.Lock()
+
+
+def start_face_audit(app, institution_id, requested_by=None, distance_threshold=None):
+    """Queue an audit of an institution's gallery on a background thread.
+
+    Progress and results live in the FaceAuditJob table, so any web
+    worker can answer a poll. Needs an app context.
+    """
+    job = FaceAuditJob(
+        id=uuid.uuid4().hex,
+        institution_id=institution_id,
+        requested_by=requested_by,
+        distance_threshold=distance_threshold if distance_threshold is not None else app.config['FACE_AUDIT_DISTANCE_THRESHOLD'],
+        status='queued'
+    )
+    db.session.add(job)
+    db.session.commit()
+    threading.Thread(target=_run_face_audit, args=(app, job.id), name=f"face-audit-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def _run_face_audit(app, job_id):
+    with _audit_lock, app.app_context():
+        job = db.session.get(FaceAuditJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            duplicates, scanned = audit_institution_gallery(
+                app, job.institution_id, job.distance_threshold,
+                tile_size=app.config['FACE_AUDIT_TILE_SIZE'],
+                workers=app.config['FACE_AUDIT_WORKERS'] or None
+            )
+            names = dict(db.session.query(User.college_id, User.name).filter(
+                User.institution_id == job.institution_id,
+                User.college_id.in_({pair[key] for pair in duplicates for key in ('college_id_a', 'college_id_b')})
+            ).all()) if duplicates else {}
+            for pair in duplicates:
+                pair['name_a'], pair['name_b'] = names.get(pair['college_id_a']), names.get(pair['college_id_b'])
+
+            job.embeddings_scanned = scanned
+            job.pairs_found = len(duplicates)
+            job.pairs = duplicates[:app.config['FACE_AUDIT_MAX_PAIRS']]
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Face audit {job_id} failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Face audit {job_id} {job.status}: {job.pairs_found} suspicious pairs in {job.embeddings_scanned} embeddings")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find faces enrolled under more than one college ID")
+    parser.add_argument('--institution', type=int, help="institution to audit")
+    parser.add_argument('--threshold', type=float, help="cosine distance below which two samples are the same face")
+    parser.add_argument('--tile-size', type=int, default=2048)
+    parser.add_argument('--workers', type=int, help="default: every core")
+    parser.add_argument('--synthetic', type=int, help="time the audit on this many random embeddings instead")
+    parser.add_argument('--dimension', type=int, default=4096, help="size of the synthetic embeddings")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    started = time.perf_counter()
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        embeddings = normalize_rows(rng.standard_normal((args.synthetic, args.dimension), dtype=np.float32))
+        college_ids = [f"S{row}" for row in range(args.synthetic)]
+        # Plant a few re-enrollments under a second ID
+        planted = min(args.synthetic // 2, 50)
+        noise = 0.01 * rng.standard_normal((planted, args.dimension), dtype=np.float32)
+        embeddings[-planted:] = normalize_rows(embeddings[:planted] + noise)
+        duplicates = find_duplicate_faces(embeddings, college_ids, args.threshold or 0.3, tile_size=args.tile_size, workers=args.workers)
+        scanned = args.synthetic
+    else:
+        from app import create_app
+
+        if args.institution is None:
+            parser.error("--institution is required unless --synthetic is given")
+        app = create_app()
+        with app.app_context():
+            duplicates, scanned = audit_institution_gallery(
+                app, args.institution, args.threshold or app.config['FACE_AUDIT_DISTANCE_THRESHOLD'],
+                tile_size=args.tile_size, workers=args.workers
+            )
+    for pair in duplicates[:50]:
+        print(f"{pair['college_id_a']:>14} {pair['college_id_b']:>14}  distance {pair['distance']:.4f}  ({pair['matching_samples']} sample pairs)")
+    print(f"✅ {len(duplicates)} suspicious pairs among {scanned} embeddings in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,729 @@
+# File: backend/face_index.py
+import os
+import json
+import mmap
+import time
+import pickle
+import tempfile
+import threading
+import logging
+
+import numpy as np
+
+from models import db, User, FaceEmbedding
+from gallery_versions import serving_gallery_version
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors):
+    """L2-normalize a 2D array of embeddings into contiguous float32"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def deepface_representation_file(db_path, model_name, detector_backend):
+    """Path of the representation pickle DeepFace.find keeps in db_path"""
+    model = model_name.lower().replace('-', '')
+    filename = f"ds_model_{model}_detector_{detector_backend}_aligned_normalization_base_expand_0.pkl"
+    return os.path.join(db_path, filename)
+
+
+def encode_vectors(vectors, precision):
+    """Compact codes of normalised vectors: float16, or int8 with a float32 scale per row"""
+    if precision == 'float16':
+        return vectors.astype(np.float16), None
+    if precision == 'int8':
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown gallery precision '{precision}'")
+
+
+def decode_vectors(codes, scales):
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+def gallery_export_dir(export_root, model_name, detector_backend, gallery_version_id=None):
+    """Directory holding the gallery exports of one model/detector pair
+    (and gallery version, so exports of a retired version are never mapped)"""
+    directory = os.path.join(export_root, f"{model_name}_{detector_backend}".lower().replace('-', ''))
+    return os.path.join(directory, f"v{gallery_version_id}") if gallery_version_id is not None else directory
+
+
+def gallery_export_manifest(export_root, model_name, detector_backend, institution_id, gallery_version_id=None):
+    """Path of the JSON manifest describing an institution's current export"""
+    directory = gallery_export_dir(export_root, model_name, detector_backend, gallery_version_id)
+    return os.path.join(directory, f"institution_{institution_id}.json")
+
+
+def college_id_from_identity(identity, db_path):
+    """Resolve the college ID from a gallery image path.
+
+    Samples live in 'known_faces/COLLEGE_ID/sample1.jpg'; legacy single
+    images directly in 'known_faces/' use the file name instead.
+    """
+    parts = identity.replace('\\', '/').split('/')
+    root = os.path.basename(os.path.normpath(db_path))
+    if len(parts) >= 2 and parts[-2] != root:
+        return parts[-2]
+    return os.path.splitext(parts[-1])[0]
+
+
+class FaceIndex:
+    """Exact cosine-similarity search over the enrolled face gallery.
+
+    Rows loaded from the legacy DeepFace pickle have no student or
+    institution and carry -1 in those arrays.
+
+    With precision 'float16' or 'int8' the first pass scans compact codes
+    kept in memory, and only the rerank_k best candidates of each query are
+    scored exactly against the float32 rows. Those rows then live in a
+    file-backed map the OS can page out, so resident gallery memory drops
+    to about a half (float16) or a quarter (int8).
+    """
+
+    scan_chunk_size = 16384
+    # Row subsets up to this size are copied out and scored directly
+    gather_limit = 1024
+
+    def __init__(self, embeddings, college_ids, student_ids=None, institution_ids=None,
+                 precision='float32', rerank_k=16):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.precision = precision
+        self.rerank_k = rerank_k
+        self._buffer = None
+        self._spilled = False
+        self._code_buffer = None
+        self._scale_buffer = None
+        self.codes = None
+        self.scales = None
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.college_ids = np.zeros(0, dtype=object)
+        self.student_ids = np.zeros(0, dtype=np.int64)
+        self.institution_ids = np.zeros(0, dtype=np.int64)
+        self._rows_by_college_id = {}
+        self.last_embedding_id = 0
+        self.last_refresh = 0.0
+        # What refresh() pulls from the database; None means no filter
+        self.model_name = None
+        self.detector_backend = None
+        self.institution_id = None
+        self.gallery_version_id = None
+        self.source_mtime = None
+        self.add(embeddings, college_ids, student_ids, institution_ids)
+
+    def __len__(self):
+        return len(self.college_ids)
+
+    @property
+    def version(self):
+        """Changes whenever embeddings are added to the gallery"""
+        return (self.last_embedding_id, len(self))
+
+    @classmethod
+    def from_deepface_db(cls, db_path, model_name, detector_backend, **options):
+        """Build the index from DeepFace's representation pickle"""
+        pkl_path = deepface_representation_file(db_path, model_name, detector_backend)
+        if not os.path.exists(pkl_path):
+            logger.warning(f"No face representations found at {pkl_path}")
+            index = cls(np.zeros((0, 0), dtype=np.float32), [], **options)
+        else:
+            with open(pkl_path, 'rb') as f:
+                representations = pickle.load(f)
+
+            representations = [r for r in representations if r.get('embedding') is not None]
+            college_ids = [college_id_from_identity(r['identity'], db_path) for r in representations]
+            embeddings = np.array([r['embedding'] for r in representations], dtype=np.float32)
+            logger.info(f"Loaded {len(college_ids)} face embeddings from {pkl_path}")
+            index = cls(embeddings, college_ids, **options)
+        index.model_name, index.detector_backend = model_name, detector_backend
+        return index
+
+    @classmethod
+    def from_gallery_export(cls, manifest_path, **options):
+        """Map an institution's exported gallery (see face_store.py).
+
+        The matrix is mapped copy-on-write: every worker on the node shares
+        the exported pages, and only rows enrolled after the export (written
+        into the file's spare capacity) become private to a worker.
+        """
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        buffer = np.load(os.path.join(os.path.dirname(manifest_path), manifest['file']), mmap_mode='c')
+
+        index = cls(np.zeros((0, 0), dtype=np.float32), [], **options)
+        count = manifest['count']
+        with index._lock:
+            index._buffer = buffer
+            index.student_ids = np.asarray(manifest['student_ids'], dtype=np.int64)
+            index.institution_ids = np.asarray(manifest['institution_ids'], dtype=np.int64)
+            index.college_ids = np.asarray(manifest['college_ids'], dtype=object)
+            index.embeddings = buffer[:count]
+            for row, college_id in enumerate(manifest['college_ids']):
+                index._rows_by_college_id.setdefault(college_id, []).append(row)
+            if index.precision != 'float32' and count:
+                # The float32 rows stay in the shared export, only the codes are private
+                index._add_codes(0, np.asarray(index.embeddings))
+        index.last_embedding_id = manifest['last_embedding_id']
+        index.model_name, index.detector_backend = manifest['model_name'], manifest['detector_backend']
+        index.institution_id = manifest['institution_id']
+        index.gallery_version_id = manifest.get('gallery_version_id')
+        index.source_mtime = os.path.getmtime(manifest_path)
+        index._adopt_export(manifest, os.path.dirname(manifest_path))
+        logger.info(f"Mapped {count} face embeddings from {manifest['file']}")
+        return index
+
+    def _adopt_export(self, manifest, directory):
+        """Pick up what the export precomputed for this kind of index"""
+
+    def add(self, embeddings, college_ids, student_ids=None, institution_ids=None):
+        """Append embeddings without touching the rows already indexed.
+
+        Rows live in an over-allocated buffer so appends are amortised, and
+        searches already running keep the view they started with.
+        """
+        count = len(college_ids)
+        if count == 0:
+            return
+        vectors = normalize_rows(embeddings)
+        student_ids = np.full(count, -1, dtype=np.int64) if student_ids is None else np.asarray(student_ids, dtype=np.int64)
+        institution_ids = np.full(count, -1, dtype=np.int64) if institution_ids is None else np.asarray(institution_ids, dtype=np.int64)
+
+        with self._lock:
+            size = len(self)
+            if size and vectors.shape[1] != self.embeddings.shape[1]:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match the gallery ({self.embeddings.shape[1]})")
+            if self._buffer is None or size + count > len(self._buffer):
+                capacity = max((size + count) * 3 // 2, 1024)
+                buffer = self._allocate(capacity, vectors.shape[1])
+                if size:
+                    buffer[:size] = self.embeddings
+                self._buffer = buffer
+            self._buffer[size:size + count] = vectors
+            if self.precision != 'float32':
+                self._add_codes(size, vectors)
+
+            self.student_ids = np.concatenate([self.student_ids, student_ids])
+            self.institution_ids = np.concatenate([self.institution_ids, institution_ids])
+            self.college_ids = np.concatenate([self.college_ids, np.asarray(college_ids, dtype=object)])
+            self.embeddings = self._buffer[:size + count]
+            # Publish the new rows for lookup only once every array covers them
+            for offset, college_id in enumerate(college_ids):
+                self._rows_by_college_id.setdefault(college_id, []).append(size + offset)
+
+    def _allocate(self, capacity, dimension):
+        """Row storage; behind compact codes it is spilled to an unlinked temp file"""
+        if self.precision == 'float32':
+            self._spilled = False
+            return np.empty((capacity, dimension), dtype=np.float32)
+        self._spilled = True
+        return np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode='w+', shape=(capacity, dimension))
+
+    def _add_codes(self, start, vectors):
+        """Encode rows start.. and publish them (callers hold the lock)"""
+        codes, scales = encode_vectors(vectors, self.precision)
+        end = start + len(vectors)
+        if self._code_buffer is None or end > len(self._code_buffer):
+            code_buffer = np.empty((len(self._buffer), vectors.shape[1]), dtype=codes.dtype)
+            scale_buffer = np.empty(len(self._buffer), dtype=np.float32) if scales is not None else None
+            if start:
+                code_buffer[:start] = self.codes
+                if scales is not None:
+                    scale_buffer[:start] = self.scales
+            self._code_buffer, self._scale_buffer = code_buffer, scale_buffer
+        self._code_buffer[start:end] = codes
+        if scales is not None:
+            self._scale_buffer[start:end] = scales
+        self.scales = self._scale_buffer[:end] if scales is not None else None
+        self.codes = self._code_buffer[:end]
+        if self._spilled and hasattr(mmap, 'MADV_DONTNEED'):
+            # The rows are safe in the file; drop them from this process's resident set
+            self._buffer.flush()
+            self._buffer._mmap.madvise(mmap.MADV_DONTNEED)
+
+    def gallery_bytes(self):
+        """Bytes of gallery data a search scans from memory"""
+        if self.precision == 'float32':
+            return self.embeddings.nbytes
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def refresh(self):
+        """Append embeddings enrolled since the last refresh. Needs an app context."""
+        with self._refresh_lock:
+            query = db.session.query(
+                FaceEmbedding.id, FaceEmbedding.embedding, FaceEmbedding.institution_id,
+                User.id, User.college_id
+            ).join(User, FaceEmbedding.student_id == User.id).filter(
+                FaceEmbedding.id > self.last_embedding_id
+            )
+            if self.model_name is not None:
+                query = query.filter(
+                    FaceEmbedding.model_name == self.model_name,
+                    FaceEmbedding.detector_backend == self.detector_backend
+                )
+            if self.institution_id is not None:
+                query = query.filter(FaceEmbedding.institution_id == self.institution_id)
+            if self.gallery_version_id is not None:
+                query = query.filter(FaceEmbedding.gallery_version_id == self.gallery_version_id)
+            rows = query.order_by(FaceEmbedding.id).all()
+            self.last_refresh = time.monotonic()
+            if not rows:
+                return 0
+
+            embeddings = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            self.add(
+                embeddings,
+                [row[4] for row in rows],
+                student_ids=[row[3] for row in rows],
+                institution_ids=[row[2] for row in rows]
+            )
+            self.last_embedding_id = rows[-1][0]
+            logger.info(f"Added {len(rows)} enrolled face embeddings to the index")
+            return len(rows)
+
+    def rows_for(self, college_ids, institution_id=None):
+        """Gallery rows holding samples of the given college IDs.
+
+        With institution_id, samples enrolled in other institutions are skipped.
+        """
+        rows = []
+        for college_id in college_ids:
+            rows.extend(self._rows_by_college_id.get(college_id, ()))
+        rows = np.array(sorted(rows), dtype=np.int64)
+        if institution_id is not None and len(rows):
+            owners = self.institution_ids[rows]
+            rows = rows[(owners == institution_id) | (owners == -1)]
+        return rows
+
+    def search(self, queries, rows=None):
+        """Return the best gallery row and its cosine similarity for each query.
+
+        When rows is given only those rows of the gallery are considered: a
+        small set (a class roster) is gathered and scored directly, a large
+        one (a whole institution) is masked while the gallery is scanned in
+        place, so a search never copies the gallery.
+        """
+        queries = normalize_rows(queries)
+        if self.precision != 'float32':
+            return self._search_compact(queries, rows)
+        gallery = self.embeddings
+        if rows is not None:
+            # Rows appended after this search started are left for the next one
+            rows = rows[rows < len(gallery)]
+        if len(gallery) == 0 or len(queries) == 0 or (rows is not None and len(rows) == 0):
+            return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), -1.0, dtype=np.float32)
+
+        if rows is not None and len(rows) <= self.gather_limit:
+            similarities = queries @ gallery[rows].T
+            best_rows = np.argmax(similarities, axis=1)
+            return rows[best_rows], similarities[np.arange(len(queries)), best_rows]
+
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(len(gallery), dtype=bool)
+            allowed[rows] = True
+        best_rows = np.full(len(queries), -1, dtype=np.int64)
+        best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        positions = np.arange(len(queries))
+        for start in range(0, len(gallery), self.scan_chunk_size):
+            similarities = queries @ gallery[start:start + self.scan_chunk_size].T
+            if allowed is not None:
+                similarities[:, ~allowed[start:start + similarities.shape[1]]] = -np.inf
+            best = np.argmax(similarities, axis=1)
+            scores = similarities[positions, best]
+            better = scores > best_scores
+            best_scores[better] = scores[better]
+            best_rows[better] = start + best[better]
+        best_scores[best_rows < 0] = -1.0
+        return best_rows, best_scores
+
+    def _search_compact(self, queries, rows=None):
+        """Top rerank_k candidates per query from the codes, re-scored exactly in float32"""
+        codes, scales, gallery = self.codes, self.scales, self.embeddings
+        size = min(len(codes) if codes is not None else 0, len(gallery))
+        if rows is not None:
+            rows = rows[rows < size]
+        total = size if rows is None else len(rows)
+        if total == 0 or len(queries) == 0:
+            return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), -1.0, dtype=np.float32)
+
+        k = min(self.rerank_k, total)
+        top_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        top_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, total, self.scan_chunk_size):
+            chunk = np.arange(start, min(start + self.scan_chunk_size, total))
+            if rows is not None:
+                chunk = rows[chunk]
+            block = decode_vectors(codes[chunk], scales[chunk] if scales is not None else None)
+            top_scores = np.concatenate([top_scores, queries @ block.T], axis=1)
+            top_rows = np.concatenate([top_rows, np.broadcast_to(chunk, (len(queries), len(chunk)))], axis=1)
+            if top_scores.shape[1] > k:
+                keep = np.argpartition(-top_scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(top_scores, keep, axis=1)
+                top_rows = np.take_along_axis(top_rows, keep, axis=1)
+
+        exact = np.einsum('qkd,qd->qk', gallery[top_rows.ravel()].reshape(len(queries), k, -1), queries)
+        best = np.argmax(exact, axis=1)
+        positions = np.arange(len(queries))
+        return top_rows[positions, best], exact[positions, best].astype(np.float32)
+
+    def match(self, queries, distance_threshold, college_ids=None, institution_id=None):
+        """Match each query face to a college ID (None when no match is close enough).
+
+        college_ids restricts the candidates, e.g. to the roster of a class,
+        and institution_id keeps other institutions' samples out.
+        """
+        if college_ids is not None:
+            rows = self.rows_for(college_ids, institution_id)
+        elif institution_id is not None:
+            owners = self.institution_ids
+            allowed = (owners == institution_id) | (owners == -1)
+            # An institution's own export holds nothing else
+            rows = None if allowed.all() else np.flatnonzero(allowed)
+        else:
+            rows = None
+        rows, scores = self.search(queries, rows)
+        matches = []
+        for row, score in zip(rows, scores):
+            if row >= 0 and 1.0 - score <= distance_threshold:
+                matches.append((self.college_ids[row], float(score)))
+            else:
+                matches.append((None, float(score)))
+        return matches
+
+
+def fuse_matches(matches):
+    """Best similarity of each matched college ID over many query faces,
+    e.g. the same student seen in several photos of one class"""
+    best = {}
+    for college_id, score in matches:
+        if college_id and score > best.get(college_id, -1.0):
+            best[college_id] = score
+    return best
+
+
+class IVFFaceIndex(FaceIndex):
+    """Approximate search over large galleries (inverted file index).
+
+    Rows are bucketed by their nearest k-means centroid and a query only
+    scores the rows of its nprobe closest buckets. nlist (0 picks
+    sqrt(gallery size)) sets the number of buckets; raising nprobe buys
+    recall with latency. Galleries below min_train_size, and searches
+    scoped to a class roster (up to gather_limit rows), stay exact;
+    searches scoped to an institution probe the buckets and skip other
+    institutions' rows.
+
+    Training reorders the gallery so every bucket is a contiguous slice;
+    rows added later are appended to their bucket's overflow list until
+    the index is re-trained (see needs_training).
+    """
+
+    min_train_size = 10000
+    train_sample_size = 100000
+
+    def __init__(self, embeddings, college_ids, student_ids=None, institution_ids=None,
+                 nlist=0, nprobe=8, train_iterations=10):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.centroids = None
+        self.trained_size = 0
+        self._bounds = None
+        self._overflow = []
+        self.exported = False
+        super().__init__(embeddings, college_ids, student_ids, institution_ids)
+        self.train()
+
+    def options(self):
+        return {'nlist': self.nlist, 'nprobe': self.nprobe, 'train_iterations': self.train_iterations}
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk_size=8192):
+        """Nearest centroid of each vector, computed in bounded-memory chunks"""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignment[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    @classmethod
+    def _kmeans(cls, embeddings, nlist, iterations, rng):
+        """Spherical k-means on a sample of the rows"""
+        size = len(embeddings)
+        sample_size = min(size, 64 * nlist, cls.train_sample_size)
+        sample = np.asarray(embeddings[np.sort(rng.choice(size, size=sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = cls._assign(sample, centroids)
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=nlist)
+            filled = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[filled]
+            centroids[filled] = normalize_rows(np.add.reduceat(sample[order], starts, axis=0))
+            # Re-seed empty buckets from random sample rows
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+        return centroids
+
+    @classmethod
+    def fit_buckets(cls, embeddings, nlist=0, train_iterations=10, seed=0):
+        """Cluster normalised rows: (centroids, the row order that lays the
+        rows out bucket by bucket, bucket bounds in that order)"""
+        size = len(embeddings)
+        nlist = min(nlist or int(np.sqrt(size)), size)
+        centroids = cls._kmeans(embeddings, nlist, train_iterations, np.random.default_rng(seed))
+        assignment = cls._assign(embeddings, centroids)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        return centroids, order, bounds
+
+    def train(self, seed=0):
+        """Cluster the gallery and lay it out bucket by bucket.
+
+        Row numbers change, so this must only run before the index is shared.
+        Exported galleries are trained by face_store.py instead.
+        """
+        size = len(self)
+        if size < self.min_train_size:
+            return
+
+        centroids, order, bounds = self.fit_buckets(self.embeddings, self.nlist, self.train_iterations, seed)
+        with self._lock:
+            self._buffer[:size] = self.embeddings[order]
+            self.college_ids = self.college_ids[order]
+            self.student_ids = self.student_ids[order]
+            self.institution_ids = self.institution_ids[order]
+            self._rows_by_college_id = {}
+            for row, college_id in enumerate(self.college_ids):
+                self._rows_by_college_id.setdefault(college_id, []).append(row)
+            self._bounds = bounds
+            self._overflow = [np.zeros(0, dtype=np.int64) for _ in range(len(centroids))]
+            self.centroids, self.trained_size = centroids, size
+        logger.info(f"Trained IVF face index: {size} rows in {len(centroids)} buckets")
+
+    def _adopt_export(self, manifest, directory):
+        """Use the buckets trained at export time. The mapped rows are never
+        reordered here, so every worker keeps sharing the export's pages."""
+        self.exported = True
+        buckets = manifest.get('ivf')
+        if buckets is None:
+            if len(self) >= self.min_train_size:
+                logger.warning(
+                    f"Gallery export of institution {manifest['institution_id']} has no IVF buckets; "
+                    f"searching it exactly until face_store.py re-exports it with FACE_INDEX_TYPE=ivf"
+                )
+            return
+        with self._lock:
+            self.centroids = np.load(os.path.join(directory, buckets['centroids']))
+            self._bounds = np.asarray(buckets['bounds'], dtype=np.int64)
+            self._overflow = [np.zeros(0, dtype=np.int64) for _ in range(len(self.centroids))]
+            self.trained_size = manifest['count']
+
+    def needs_training(self):
+        """True once the gallery is big enough to train, or has doubled since
+        training. Exported galleries are re-trained by re-exporting them."""
+        if self.exported:
+            return False
+        if self.centroids is None:
+            return len(self) >= self.min_train_size
+        return len(self) >= 2 * self.trained_size
+
+    def add(self, embeddings, college_ids, student_ids=None, institution_ids=None):
+        """Append rows to the overflow list of their nearest bucket"""
+        start = len(self)
+        super().add(embeddings, college_ids, student_ids, institution_ids)
+        if self.centroids is None or len(self) == start:
+            return
+
+        assignment = self._assign(self.embeddings[start:], self.centroids)
+        overflow = list(self._overflow)
+        for bucket in np.unique(assignment):
+            overflow[bucket] = np.concatenate([overflow[bucket], start + np.flatnonzero(assignment == bucket)])
+        self._overflow = overflow
+
+    def search(self, queries, rows=None):
+        """Best row per query among the buckets closest to it.
+
+        Queries probing the same bucket are scored together against its
+        contiguous slice of the gallery.
+        """
+        centroids, bounds, overflow = self.centroids, self._bounds, self._overflow
+        gallery = self.embeddings
+        if rows is not None:
+            rows = rows[rows < len(gallery)]
+        if centroids is None or (rows is not None and len(rows) <= self.gather_limit):
+            return super().search(queries, rows)
+
+        queries = normalize_rows(queries)
+        allowed = None
+        if rows is not None:
+            # Candidates of the probed buckets outside rows (another institution) are skipped
+            allowed = np.zeros(len(gallery), dtype=bool)
+            allowed[rows] = True
+        best_rows = np.full(len(queries), -1, dtype=np.int64)
+        best_scores = np.full(len(queries), -np.inf, dtype=np.float32)
+        if len(queries) == 0:
+            return best_rows, best_scores
+
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe].ravel()
+        probing_queries = np.repeat(np.arange(len(queries)), nprobe)
+        order = np.argsort(probes, kind='stable')
+        buckets, starts = np.unique(probes[order], return_index=True)
+
+        for bucket, members in zip(buckets, np.split(probing_queries[order], starts[1:])):
+            candidates = np.arange(bounds[bucket], bounds[bucket + 1])
+            block = gallery[bounds[bucket]:bounds[bucket + 1]]
+            extra = overflow[bucket]
+            extra = extra[extra < len(gallery)]
+            if len(extra):
+                candidates = np.concatenate([candidates, extra])
+                block = np.concatenate([block, gallery[extra]])
+            if len(candidates) == 0:
+                continue
+            similarities = queries[members] @ block.T
+            if allowed is not None:
+                similarities[:, ~allowed[candidates]] = -np.inf
+            best = np.argmax(similarities, axis=1)
+            scores = similarities[np.arange(len(members)), best]
+            better = scores > best_scores[members]
+            best_scores[members[better]] = scores[better]
+            best_rows[members[better]] = candidates[best[better]]
+
+        best_scores[best_rows < 0] = -1.0
+        return best_rows, best_scores
+
+
+FACE_INDEX_TYPES = {
+    'exact': FaceIndex,
+    'ivf': IVFFaceIndex,
+}
+
+
+def face_index_options(app):
+    """Index class and constructor options selected by the app config"""
+    index_type = app.config['FACE_INDEX_TYPE']
+    if index_type not in FACE_INDEX_TYPES:
+        raise ValueError(f"Unknown FACE_INDEX_TYPE '{index_type}'")
+    options = {}
+    if index_type == 'ivf':
+        options = {'nlist': app.config['FACE_IVF_NLIST'], 'nprobe': app.config['FACE_IVF_NPROBE']}
+    else:
+        options = {'precision': app.config['FACE_GALLERY_PRECISION'], 'rerank_k': app.config['FACE_RERANK_K']}
+    return FACE_INDEX_TYPES[index_type], options
+
+
+# Resident indexes of this worker process: the whole gallery under None,
+# plus one per institution served from a gallery export
+_face_indexes = {}
+_face_index_lock = threading.Lock()
+
+
+def _export_manifest(app, institution_id, gallery_version_id):
+    export_root = app.config['FACE_GALLERY_EXPORT_DIR']
+    if not export_root or institution_id is None:
+        return None
+    path = gallery_export_manifest(
+        export_root, app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'],
+        institution_id, gallery_version_id
+    )
+    return path if os.path.exists(path) else None
+
+
+def _build_face_index(app, manifest, gallery_version_id):
+    index_class, options = face_index_options(app)
+    if manifest is not None:
+        index = index_class.from_gallery_export(manifest, **options)
+    else:
+        index = index_class.from_deepface_db(
+            app.config['KNOWN_FACES_DIR'],
+            app.config['FACE_MODEL_NAME'],
+            app.config['FACE_DETECTOR_BACKEND'],
+            **options
+        )
+    index.gallery_version_id = gallery_version_id
+    index.refresh()
+    return index
+
+
+def load_face_index(app, institution_id=None):
+    """Return the worker's face index for an institution.
+
+    Institutions with a gallery export get their own memory-mapped index
+    (re-mapped when the export is replaced); everything else shares the
+    index built from the legacy pickle and the database. The gallery is
+    loaded on first use; afterwards embeddings enrolled by any worker are
+    appended at most every FACE_INDEX_REFRESH_SECONDS. When another gallery
+    version is activated (see reindex_gallery.py) the index is rebuilt from
+    it. Needs an app context.
+    """
+    gallery_version_id = serving_gallery_version(app)
+    manifest = _export_manifest(app, institution_id, gallery_version_id)
+    key = institution_id if manifest is not None else None
+    index = _face_indexes.get(key)
+    if index is None or index.gallery_version_id != gallery_version_id:
+        with _face_index_lock:
+            index = _face_indexes.get(key)
+            if index is None or index.gallery_version_id != gallery_version_id:
+                # Indexes of the previous version are dropped, not refreshed
+                for stale in [k for k, other in _face_indexes.items() if other.gallery_version_id != gallery_version_id]:
+                    del _face_indexes[stale]
+                index = _face_indexes[key] = _build_face_index(app, manifest, gallery_version_id)
+    elif time.monotonic() - index.last_refresh >= app.config['FACE_INDEX_REFRESH_SECONDS']:
+        if manifest is not None and os.path.getmtime(manifest) != index.source_mtime:
+            with _face_index_lock:
+                index = _face_indexes[key] = _build_face_index(app, manifest, gallery_version_id)
+            return index
+        index.refresh()
+        if getattr(index, 'needs_training', lambda: False)():
+            index = retrain_face_index(key)
+    return index
+
+
+def exported_institutions(app):
+    """Institutions with a gallery export for the configured model"""
+    export_root = app.config['FACE_GALLERY_EXPORT_DIR']
+    if not export_root:
+        return []
+    directory = gallery_export_dir(
+        export_root, app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'], serving_gallery_version(app)
+    )
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name[len('institution_'):-len('.json')]) for name in os.listdir(directory)
+        if name.startswith('institution_') and name.endswith('.json')
+    )
+
+
+def retrain_face_index(key=None):
+    """Swap in a freshly trained copy of one of the worker's approximate indexes.
+
+    Training reorders rows, so it runs on a copy while searches keep
+    using the current index. Returns the index now in use.
+    """
+    with _face_index_lock:
+        current = _face_indexes.get(key)
+        if current is None or not current.needs_training():
+            return current
+        with current._refresh_lock:
+            retrained = type(current)(
+                current.embeddings, current.college_ids,
+                current.student_ids, current.institution_ids,
+                **current.options()
+            )
+            for attribute in ('last_embedding_id', 'last_refresh', 'model_name',
+                              'detector_backend', 'institution_id', 'gallery_version_id', 'source_mtime'):
+                setattr(retrained, attribute, getattr(current, attribute))
+        _face_indexes[key] = retrained
+        return retrained
@@ -0,0 +1,358 @@
+# File: backend/face_pipeline.py
+import io
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from face_index import load_face_index, exported_institutions
+from metrics import timed
+from face_quality import assess_faces
+
+logger = logging.getLogger(__name__)
+
+# Lazy loading for heavy libraries to improve startup time
+DeepFace = None
+def load_deepface():
+    global DeepFace
+    if DeepFace is None:
+        from deepface import DeepFace as df
+        DeepFace = df
+    return DeepFace
+
+
+# Embedding backend of this process: 'tensorflow' (DeepFace's Keras models) or 'onnx'
+_embedding_backend = {'name': 'tensorflow', 'onnx_dir': None, 'threads': 0}
+_onnx_models = {}
+_onnx_models_lock = threading.Lock()
+
+
+def configure_embedding_backend(name, onnx_dir=None, threads=0):
+    if name not in ('tensorflow', 'onnx'):
+        raise ValueError(f"Unknown FACE_EMBED_BACKEND '{name}'")
+    _embedding_backend.update(name=name, onnx_dir=onnx_dir, threads=threads)
+
+
+def build_embedding_model(model_name):
+    """The embedding model of the configured backend (built once per process)"""
+    if _embedding_backend['name'] != 'onnx':
+        return load_deepface().build_model(model_name)
+    model = _onnx_models.get(model_name)
+    if model is None:
+        from onnx_backend import load_onnx_model
+        with _onnx_models_lock:
+            model = _onnx_models.get(model_name)
+            if model is None:
+                model = _onnx_models[model_name] = load_onnx_model(
+                    model_name, _embedding_backend['onnx_dir'], _embedding_backend['threads']
+                )
+    return model
+
+
+def decode_image(data, max_dimension=None):
+    """Decode uploaded image bytes into a BGR array, entirely in memory.
+
+    EXIF orientation is applied so phone photos reach the detector upright,
+    and images larger than max_dimension are scaled down. JPEGs are decoded
+    straight at a reduced scale when possible.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        if max_dimension:
+            img.draft('RGB', (max_dimension, max_dimension))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Unsupported or corrupt image: {e}")
+
+    if max_dimension and max(img.size) > max_dimension:
+        img.thumbnail((max_dimension, max_dimension))
+    return np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+
+
+def detect_faces(img, detector_backend):
+    """Detect and align every face in a BGR image.
+
+    Returns DeepFace's face objects: an RGB crop in [0, 1] under 'face',
+    plus 'facial_area' and 'confidence'.
+    """
+    df_face = load_deepface()
+    faces = df_face.extract_faces(
+        img_path=img,
+        detector_backend=detector_backend,
+        align=True,
+        enforce_detection=False
+    )
+    # With enforce_detection=False DeepFace returns the whole image at zero confidence
+    return [face for face in faces if face.get('confidence', 0) > 0]
+
+
+def face_boxes(faces):
+    """(x1, y1, x2, y2) boxes of DeepFace face objects"""
+    areas = [face['facial_area'] for face in faces]
+    return np.array([[a['x'], a['y'], a['x'] + a['w'], a['y'] + a['h']] for a in areas], dtype=np.float32).reshape(-1, 4)
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise intersection-over-union of two sets of boxes"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    overlap = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return overlap / np.maximum(area_a[:, None] + area_b[None, :] - overlap, 1e-6)
+
+
+# Landmark points DeepFace may report in a facial_area, as (x, y)
+LANDMARKS = ('left_eye', 'right_eye', 'nose', 'mouth_left', 'mouth_right')
+
+
+def _shift_area(area, dx, dy):
+    """A facial_area detected in a crop, moved into the whole image's
+    coordinates: the box and its landmark points alike"""
+    shifted = dict(area, x=area['x'] + dx, y=area['y'] + dy)
+    for key in LANDMARKS:
+        point = area.get(key)
+        if point is not None:
+            shifted[key] = (point[0] + dx, point[1] + dy)
+    return shifted
+
+
+def _tiles(height, width, grid, overlap):
+    """(y1, y2, x1, x2) of a grid x grid tiling, each tile padded by overlap"""
+    pad_y, pad_x = int(height / grid * overlap), int(width / grid * overlap)
+    tiles = []
+    for row in range(grid):
+        for col in range(grid):
+            y1, y2 = row * height // grid, (row + 1) * height // grid
+            x1, x2 = col * width // grid, (col + 1) * width // grid
+            tiles.append((max(y1 - pad_y, 0), min(y2 + pad_y, height), max(x1 - pad_x, 0), min(x2 + pad_x, width)))
+    return tiles
+
+
+def detect_faces_cascade(img, fast_backend, slow_backend, expected_faces=None, grid=2,
+                         min_confidence=0.9, roster_ratio=0.9, overlap=0.15, timings=None):
+    """Detect with a cheap detector and re-detect only where it looks weak.
+
+    The slow detector runs on a tile when the fast one found a
+    low-confidence box there, or clearly fewer faces than in the other
+    tiles; every tile is escalated when the photo holds fewer faces than
+    roster_ratio of the expected_faces. Detections of both passes are
+    merged, preferring the slow detector's box where they overlap.
+    """
+    with timed(timings, 'detect'):
+        faces = detect_faces(img, fast_backend)
+    height, width = img.shape[:2]
+    tiles = _tiles(height, width, grid, overlap)
+
+    boxes = face_boxes(faces)
+    centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+    confidences = np.array([face.get('confidence', 0) for face in faces], dtype=np.float32)
+    counts, weak = [], []
+    for y1, y2, x1, x2 in tiles:
+        inside = (centres[:, 0] >= x1) & (centres[:, 0] < x2) & (centres[:, 1] >= y1) & (centres[:, 1] < y2)
+        counts.append(int(inside.sum()))
+        weak.append(bool((confidences[inside] < min_confidence).any()))
+    counts = np.array(counts)
+    sparse = counts < np.median(counts) / 2
+    if expected_faces and len(faces) < roster_ratio * expected_faces:
+        escalate = np.ones(len(tiles), dtype=bool)
+    else:
+        escalate = sparse | np.array(weak)
+    if not escalate.any():
+        return faces
+
+    extra = []
+    with timed(timings, 'detect_cascade'):
+        for (y1, y2, x1, x2), needed in zip(tiles, escalate):
+            if not needed:
+                continue
+            for face in detect_faces(np.ascontiguousarray(img[y1:y2, x1:x2]), slow_backend):
+                extra.append(dict(face, facial_area=_shift_area(face['facial_area'], x1, y1)))
+    logger.info(f"Detector cascade: {int(escalate.sum())}/{len(tiles)} tiles escalated, "
+                f"{len(faces)} fast and {len(extra)} slow detections")
+
+    # Non-maximum suppression, slow detections first so they win overlaps
+    merged = extra + faces
+    priority = np.concatenate([np.ones(len(extra)), np.zeros(len(faces))])
+    merged_confidence = np.array([face.get('confidence', 0) for face in merged], dtype=np.float32)
+    order = np.lexsort((-merged_confidence, -priority))
+    iou = box_iou(face_boxes(merged), face_boxes(merged))
+    kept = []
+    for position in order:
+        if all(iou[position, other] < 0.4 for other in kept):
+            kept.append(position)
+    return [merged[position] for position in sorted(kept)]
+
+
+def cascade_options(app):
+    """Detector cascade settings from the app config, or None when it is off"""
+    if not app.config['FACE_CASCADE_DETECTOR']:
+        return None
+    return {
+        'slow_backend': app.config['FACE_CASCADE_DETECTOR'],
+        'grid': app.config['FACE_CASCADE_GRID'],
+        'min_confidence': app.config['FACE_CASCADE_MIN_CONFIDENCE'],
+        'roster_ratio': app.config['FACE_CASCADE_ROSTER_RATIO']
+    }
+
+
+def represent_frames(images, model_name, detector_backend, batch_size=32, workers=1,
+                     cascade=None, expected_faces=None, quality=None, batcher=None, timings=None):
+    """Embed the faces of several photos of the same scene together.
+
+    Each photo goes through the detector (or the detector cascade, see
+    cascade_options). With quality thresholds (see quality_options) only
+    crops passing the quality gate are embedded; the crops of all photos
+    share the embedding batches. Returns the embeddings, for each row the
+    position of the photo it was found in, and the rejected faces.
+    """
+    faces, frames = [], []
+    for position, img in enumerate(images):
+        if cascade:
+            detected = detect_faces_cascade(img, detector_backend, expected_faces=expected_faces,
+                                            timings=timings, **cascade)
+        else:
+            with timed(timings, 'detect'):
+                detected = detect_faces(img, detector_backend)
+        faces.extend(detected)
+        frames.extend([position] * len(detected))
+
+    rejected = []
+    if quality and faces:
+        with timed(timings, 'quality'):
+            passed, reasons = assess_faces(faces, **quality)
+        rejected = [
+            {'photo': frame + 1, 'facial_area': _box_only(face['facial_area']), 'reasons': why}
+            for face, frame, ok, why in zip(faces, frames, passed, reasons) if not ok
+        ]
+        faces = [face for face, ok in zip(faces, passed) if ok]
+        frames = [frame for frame, ok in zip(frames, passed) if ok]
+
+    with timed(timings, 'embed'):
+        embeddings = embed_faces(faces, model_name, batch_size=batch_size, workers=workers, batcher=batcher)
+    return embeddings, np.asarray(frames, dtype=np.int64), rejected
+
+
+def _box_only(area):
+    return {key: int(area[key]) for key in ('x', 'y', 'w', 'h')}
+
+
+def _forward_batch(model, batch):
+    """Run a preprocessed batch through the embedding model in one pass"""
+    if hasattr(model, 'forward_batch'):
+        return np.asarray(model.forward_batch(batch), dtype=np.float32)
+    keras_model = getattr(model, 'model', None)
+    if keras_model is not None and callable(keras_model):
+        output = keras_model(batch, training=False)
+        return np.asarray(output.numpy() if hasattr(output, 'numpy') else output, dtype=np.float32)
+    # Models without a batched graph (e.g. dlib) are embedded one crop at a time
+    return np.array([model.forward(img[np.newaxis, ...]) for img in batch], dtype=np.float32)
+
+
+def preprocess_faces(faces, target_size, normalization='base'):
+    """Stack aligned crops into one model-ready tensor.
+
+    Mirrors DeepFace.represent's preprocessing so the vectors are
+    comparable with those DeepFace produces for the same model.
+    """
+    from deepface.modules import preprocessing
+
+    batch = []
+    for face in faces:
+        img = face['face'][:, :, ::-1]  # RGB to BGR, as DeepFace.represent does
+        img = preprocessing.resize_image(img=img, target_size=(target_size[1], target_size[0]))
+        img = preprocessing.normalize_input(img=img, normalization=normalization)
+        batch.append(img)
+    return np.concatenate(batch, axis=0)
+
+
+def embed_faces(faces, model_name, normalization='base', batch_size=32, workers=1, batcher=None):
+    """Embed aligned face crops in batches of batch_size.
+
+    With workers > 1 the batches of a large group photo are run through
+    the model concurrently on that many threads. With a batcher (see
+    embedding_batcher.py) the crops are instead handed to the process's
+    shared scheduler, which batches them with other requests' crops.
+    """
+    if not faces:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    model = build_embedding_model(model_name)
+    tensor = preprocess_faces(faces, model.input_shape, normalization)
+    if batcher is not None:
+        return batcher.embed(tensor)
+    batches = [tensor[start:start + batch_size] for start in range(0, len(tensor), batch_size)]
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            outputs = list(pool.map(lambda batch: _forward_batch(model, batch), batches))
+    else:
+        outputs = [_forward_batch(model, batch) for batch in batches]
+    return np.concatenate([output.reshape(len(batch), -1) for output, batch in zip(outputs, batches)])
+
+
+def embed_enrollment_samples(images, model_name, detector_backend):
+    """Embed one face per enrollment photo in a single batch.
+
+    The largest detected face of each photo is used. Returns the embeddings,
+    a list of per-sample error messages for photos without a face, and the
+    positions of the photos the embeddings belong to.
+    """
+    crops, errors, positions = [], [], []
+    for position, img in enumerate(images):
+        faces = detect_faces(img, detector_backend)
+        if not faces:
+            errors.append(f"Sample {position + 1}: No face detected")
+            continue
+        crops.append(max(faces, key=lambda f: f['facial_area']['w'] * f['facial_area']['h']))
+        positions.append(position)
+
+    embeddings = embed_faces(crops, model_name)
+    logger.info(f"Embedded {len(crops)} enrollment samples ({len(errors)} rejected)")
+    return embeddings, errors, positions
+
+
+# Warm-up state of this worker's face pipeline
+_warm_up = {'state': 'cold', 'seconds': None, 'error': None}
+_warm_up_lock = threading.Lock()
+
+
+def warm_model(model_name, detector_backend):
+    """Initialise the detector and run a dummy inference through the model"""
+    detect_faces(np.zeros((224, 224, 3), dtype=np.uint8), detector_backend)
+    embed_faces([{'face': np.zeros((224, 224, 3), dtype=np.float32)}], model_name)
+
+
+def warm_up(app):
+    """Load the gallery index, the detector and the embedding model, then
+    run a dummy inference so the first attendance request pays for none of it"""
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            for institution_id in exported_institutions(app) or [None]:
+                load_face_index(app, institution_id)
+        warm_model(app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'])
+        if app.config['FACE_CASCADE_DETECTOR']:
+            detect_faces(np.zeros((224, 224, 3), dtype=np.uint8), app.config['FACE_CASCADE_DETECTOR'])
+    except Exception as e:
+        logger.error(f"Face pipeline warm-up failed: {e}")
+        _warm_up.update(state='failed', error=str(e))
+        return
+    _warm_up.update(state='ready', seconds=round(time.perf_counter() - start, 2), error=None)
+    logger.info(f"Face pipeline warm in {_warm_up['seconds']}s")
+
+
+def start_warm_up(app):
+    """Warm the pipeline up in a background thread (once per worker).
+
+    Returns the warm-up state; a failed warm-up is reported once more
+    while it is retried.
+    """
+    with _warm_up_lock:
+        status = dict(_warm_up)
+        if status['state'] in ('cold', 'failed'):
+            _warm_up.update(state='warming', error=None)
+            threading.Thread(target=warm_up, args=(app,), name='face-warm-up', daemon=True).start()
+        return status if status['state'] == 'failed' else dict(_warm_up)
@@ -0,0 +1,77 @@
+# File: backend/face_quality.py
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Side of the grayscale thumbnails the sharpness of all crops is measured on
+SHARPNESS_SIDE = 64
+
+
+def _sharpness(faces):
+    """Variance of the Laplacian of each crop, on a shared 0-255 grayscale scale"""
+    import cv2
+
+    thumbs = np.stack([
+        cv2.resize(np.asarray(face['face'], dtype=np.float32), (SHARPNESS_SIDE, SHARPNESS_SIDE), interpolation=cv2.INTER_AREA)
+        for face in faces
+    ])
+    gray = 255 * (0.299 * thumbs[..., 0] + 0.587 * thumbs[..., 1] + 0.114 * thumbs[..., 2])
+    laplacian = (gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+                 - 4 * gray[:, 1:-1, 1:-1])
+    return laplacian.reshape(len(faces), -1).var(axis=1)
+
+
+def _pose_offset(faces):
+    """Horizontal offset of the eyes' midpoint from the box centre, as a
+    fraction of the box width (0 = frontal); NaN when eyes are unknown.
+
+    Eyes and box must be in the same (whole image) coordinates; a midpoint
+    outside its box means they are not, and counts as unknown.
+    """
+    offsets = np.full(len(faces), np.nan, dtype=np.float32)
+    for position, face in enumerate(faces):
+        area = face['facial_area']
+        left, right = area.get('left_eye'), area.get('right_eye')
+        if left is not None and right is not None and area['w']:
+            midpoint = (left[0] + right[0]) / 2
+            if not area['x'] <= midpoint <= area['x'] + area['w']:
+                logger.warning(f"Eye points {left}, {right} lie outside their face box {area['x']}..{area['x'] + area['w']}; skipping the pose check")
+                continue
+            offsets[position] = abs(midpoint - (area['x'] + area['w'] / 2)) / area['w']
+    return offsets
+
+
+def assess_faces(faces, min_size=32, min_sharpness=40.0, max_pose_offset=0.2, min_confidence=0.0):
+    """Score detected faces before they are embedded.
+
+    Returns a boolean mask of the faces worth embedding and, for each
+    face, the list of reasons it failed (empty when it passed).
+    """
+    if not faces:
+        return np.zeros(0, dtype=bool), []
+
+    sizes = np.array([min(face['facial_area']['w'], face['facial_area']['h']) for face in faces])
+    confidences = np.array([face.get('confidence', 0) for face in faces], dtype=np.float32)
+    checks = {
+        'too_small': sizes < min_size,
+        'blurred': _sharpness(faces) < min_sharpness,
+        'turned_away': _pose_offset(faces) > max_pose_offset,  # NaN (no eyes) never fails
+        'low_confidence': confidences < min_confidence,
+    }
+    failed = np.stack(list(checks.values()), axis=1)
+    reasons = [[name for name, hit in zip(checks, row) if hit] for row in failed]
+    return ~failed.any(axis=1), reasons
+
+
+def quality_options(app):
+    """Quality gate thresholds from the app config, or None when it is off"""
+    if not app.config['FACE_QUALITY_GATE']:
+        return None
+    return {
+        'min_size': app.config['FACE_MIN_SIZE'],
+        'min_sharpness': app.config['FACE_MIN_SHARPNESS'],
+        'max_pose_offset': app.config['FACE_MAX_POSE_OFFSET'],
+        'min_confidence': app.config['FACE_MIN_CONFIDENCE']
+    }
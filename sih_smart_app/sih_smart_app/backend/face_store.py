@@ -0,0 +1,193 @@
+# File: backend/face_store.py
+"""
+Export the enrolled face gallery of each institution as a memory-mapped
+float32 matrix (.npy) plus a JSON manifest. Workers map the export
+copy-on-write, so a node pays for each gallery's memory once instead of
+once per gunicorn worker.
+
+Usage: python face_store.py [--institution 1 2] [--spare 0.5]
+"""
+
+import os
+import glob
+import json
+import math
+import time
+import logging
+import argparse
+
+import numpy as np
+
+from models import db, User, FaceEmbedding
+from face_index import FaceIndex, IVFFaceIndex, normalize_rows, gallery_export_dir, gallery_export_manifest
+from gallery_versions import active_gallery_version
+
+logger = logging.getLogger(__name__)
+
+
+def export_institution_gallery(institution_id, export_root, model_name, detector_backend,
+                               legacy_db_path=None, spare=0.5, chunk_size=4096, gallery_version_id=None, ivf=None):
+    """Write one institution's gallery and switch its manifest over to it.
+
+    Vectors are stored L2-normalised, in enrollment order (or bucket order,
+    see ivf), after any rows of the legacy DeepFace pickle. The matrix keeps `spare` extra capacity
+    so workers can append later enrollments without copying it. Returns
+    the manifest path. With gallery_version_id only that version's rows are
+    exported, into the version's own directory. With ivf (IVFFaceIndex
+    options) a large gallery is clustered here and written bucket by
+    bucket, so workers map it ready to search. Needs an app context.
+    """
+    legacy = FaceIndex.from_deepface_db(legacy_db_path, model_name, detector_backend) if legacy_db_path else None
+    scope = (
+        FaceEmbedding.institution_id == institution_id,
+        FaceEmbedding.model_name == model_name,
+        FaceEmbedding.detector_backend == detector_backend
+    )
+    if gallery_version_id is not None:
+        scope += (FaceEmbedding.gallery_version_id == gallery_version_id,)
+    # Snapshot the rows enrolled so far; later ones reach workers through refresh()
+    last_embedding_id = db.session.query(db.func.max(FaceEmbedding.id)).filter(*scope).scalar() or 0
+    query = db.session.query(
+        FaceEmbedding.id, FaceEmbedding.embedding, FaceEmbedding.student_id, User.college_id
+    ).join(User, FaceEmbedding.student_id == User.id).filter(
+        *scope, FaceEmbedding.id <= last_embedding_id
+    ).order_by(FaceEmbedding.id)
+
+    legacy_count = len(legacy) if legacy is not None else 0
+    count = legacy_count + query.count()
+    first = query.first()
+    if first is not None:
+        dimension = len(np.frombuffer(first[1], dtype=np.float32))
+    elif legacy_count:
+        dimension = legacy.embeddings.shape[1]
+    else:
+        logger.info(f"Institution {institution_id} has no enrolled faces to export")
+        return None
+
+    directory = gallery_export_dir(export_root, model_name, detector_backend, gallery_version_id)
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = gallery_export_manifest(export_root, model_name, detector_backend, institution_id, gallery_version_id)
+    matrix_name = f"institution_{institution_id}_{int(time.time())}.npy"
+    matrix_path = os.path.join(directory, matrix_name)
+
+    college_ids, student_ids, institution_ids = [], [], []
+    capacity = max(math.ceil(count * (1 + spare)), count + 1)
+    tmp_path = f"{matrix_path}.tmp"
+    matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, dimension))
+    try:
+        if legacy_count:
+            matrix[:legacy_count] = legacy.embeddings
+            college_ids.extend(legacy.college_ids.tolist())
+            student_ids.extend([-1] * legacy_count)
+            institution_ids.extend([-1] * legacy_count)
+
+        # Stream the rows in chunks so the export never holds the gallery twice
+        row, chunk = legacy_count, []
+        for record in query.yield_per(chunk_size):
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                row = _write_chunk(matrix, row, chunk, college_ids, student_ids)
+                chunk = []
+        row = _write_chunk(matrix, row, chunk, college_ids, student_ids)
+        institution_ids.extend([institution_id] * (row - legacy_count))
+        matrix.flush()
+
+        buckets = None
+        if ivf is not None and row >= IVFFaceIndex.min_train_size:
+            centroids, order, bounds = IVFFaceIndex.fit_buckets(matrix[:row], **ivf)
+            ordered_path = f"{matrix_path}.ordered.tmp"
+            ordered = np.lib.format.open_memmap(ordered_path, mode='w+', dtype=np.float32, shape=(capacity, dimension))
+            for start in range(0, row, chunk_size):
+                rows = order[start:start + chunk_size]
+                ordered[start:start + len(rows)] = matrix[rows]
+            ordered.flush()
+            del ordered
+            os.replace(ordered_path, tmp_path)
+            college_ids = [college_ids[i] for i in order]
+            student_ids = [student_ids[i] for i in order]
+            institution_ids = [institution_ids[i] for i in order]
+            centroids_name = f"{os.path.splitext(matrix_name)[0]}_centroids.npy"
+            np.save(os.path.join(directory, centroids_name), centroids)
+            buckets = {'centroids': centroids_name, 'bounds': bounds.tolist()}
+            logger.info(f"Clustered the gallery of institution {institution_id} into {len(centroids)} IVF buckets")
+    finally:
+        del matrix
+    os.replace(tmp_path, matrix_path)
+
+    manifest = {
+        'file': matrix_name,
+        'count': row,
+        'dimension': dimension,
+        'institution_id': institution_id,
+        'model_name': model_name,
+        'detector_backend': detector_backend,
+        'gallery_version_id': gallery_version_id,
+        'last_embedding_id': last_embedding_id,
+        'college_ids': college_ids,
+        'student_ids': student_ids,
+        'institution_ids': institution_ids,
+        'ivf': buckets,
+    }
+
+    # Workers switch over only once the new manifest is complete
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    _remove_old_exports(directory, institution_id, keep={matrix_name, buckets['centroids'] if buckets else None})
+    logger.info(f"Exported {row} face embeddings of institution {institution_id} to {matrix_path}")
+    return manifest_path
+
+
+def _write_chunk(matrix, row, chunk, college_ids, student_ids):
+    if not chunk:
+        return row
+    vectors = np.stack([np.frombuffer(record[1], dtype=np.float32) for record in chunk])
+    matrix[row:row + len(chunk)] = normalize_rows(vectors)
+    student_ids.extend(record[2] for record in chunk)
+    college_ids.extend(record[3] for record in chunk)
+    return row + len(chunk)
+
+
+def _remove_old_exports(directory, institution_id, keep):
+    """Delete superseded matrices; workers still mapping one keep their pages"""
+    for path in glob.glob(os.path.join(directory, f"institution_{institution_id}_*.npy")):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove old gallery export {path}: {e}")
+
+
+def export_galleries(app, institution_ids=None, spare=0.5):
+    """Export every institution with enrolled faces (or the given ones)
+    from the active gallery version"""
+    with app.app_context():
+        version = active_gallery_version(app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'])
+        if institution_ids is None:
+            institution_ids = [row[0] for row in db.session.query(FaceEmbedding.institution_id).distinct()]
+        return [
+            export_institution_gallery(
+                institution_id,
+                app.config['FACE_GALLERY_EXPORT_DIR'],
+                app.config['FACE_MODEL_NAME'],
+                app.config['FACE_DETECTOR_BACKEND'],
+                legacy_db_path=app.config['KNOWN_FACES_DIR'],
+                spare=spare,
+                gallery_version_id=version.id if version is not None else None,
+                ivf={'nlist': app.config['FACE_IVF_NLIST']} if app.config['FACE_INDEX_TYPE'] == 'ivf' else None
+            )
+            for institution_id in institution_ids
+        ]
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Export per-institution face galleries for memory mapping")
+    parser.add_argument('--institution', type=int, nargs='+', help="default: every institution with enrolled faces")
+    parser.add_argument('--spare', type=float, default=0.5, help="extra capacity for later enrollments")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for path in export_galleries(create_app(), args.institution, args.spare):
+        if path:
+            print(f"✅ {path}")
@@ -0,0 +1,146 @@
+# File: backend/gallery_versions.py
+import os
+import time
+import pickle
+import logging
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, GalleryVersion, FaceEmbedding
+
+logger = logging.getLogger(__name__)
+
+
+def active_gallery_version(model_name, detector_backend, create=False):
+    """The version of a model/detector pair workers serve, or None.
+
+    With create, the first enrollment of a pair opens an active version and
+    adopts the pair's embeddings enrolled before versions existed.
+    """
+    version = GalleryVersion.query.filter_by(
+        model_name=model_name, detector_backend=detector_backend, status='active'
+    ).first()
+    if version is None and create:
+        version = GalleryVersion(
+            model_name=model_name, detector_backend=detector_backend,
+            status='active', activated_at=datetime.utcnow()
+        )
+        db.session.add(version)
+        db.session.flush()
+        adopted = FaceEmbedding.query.filter_by(
+            model_name=model_name, detector_backend=detector_backend, gallery_version_id=None
+        ).update({'gallery_version_id': version.id}, synchronize_session=False)
+        version.samples_total = version.samples_done = adopted
+        logger.info(f"Opened gallery version {version.id} for {model_name}/{detector_backend} ({adopted} embeddings adopted)")
+    return version
+
+
+def legacy_college_ids(db_path, model_name, detector_backend):
+    """College IDs in the legacy DeepFace pickle of a model/detector pair"""
+    from face_index import deepface_representation_file, college_id_from_identity
+
+    path = deepface_representation_file(db_path, model_name, detector_backend)
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb') as f:
+        representations = pickle.load(f)
+    return {college_id_from_identity(r['identity'], db_path) for r in representations if r.get('embedding') is not None}
+
+
+def students_missing_from(version_id):
+    """Number of students recognised today that a version's model/detector
+    would not recognise. Counts students with embeddings in an active
+    version (or enrolled before versions existed) but none in this one,
+    and college IDs of the served legacy pickles (KNOWN_FACES_DIR) missing
+    from the pickle of the version's pair. Needs an app context."""
+    version = db.session.get(GalleryVersion, version_id)
+    covered = db.session.query(FaceEmbedding.student_id).filter(FaceEmbedding.gallery_version_id == version_id)
+    missing = db.session.query(db.func.count(db.distinct(FaceEmbedding.student_id))).outerjoin(
+        GalleryVersion, FaceEmbedding.gallery_version_id == GalleryVersion.id
+    ).filter(
+        db.or_(FaceEmbedding.gallery_version_id.is_(None), GalleryVersion.status == 'active'),
+        FaceEmbedding.student_id.notin_(covered)
+    ).scalar()
+
+    db_path = current_app.config['KNOWN_FACES_DIR']
+    served_pairs = set(db.session.query(GalleryVersion.model_name, GalleryVersion.detector_backend).filter_by(status='active'))
+    served_pairs.add((current_app.config['FACE_MODEL_NAME'], current_app.config['FACE_DETECTOR_BACKEND']))
+    served = set().union(*(legacy_college_ids(db_path, *pair) for pair in served_pairs))
+    return missing + len(served - legacy_college_ids(db_path, version.model_name, version.detector_backend))
+
+
+def activate_gallery_version(version_id):
+    """Make a built version the one served for its model/detector pair.
+
+    The previously active version of the pair is retired in the same
+    transaction, so workers see either the old version or the new one,
+    never both. Versions of other pairs stay active on purpose: during a
+    rolling switch of FACE_MODEL_NAME/FACE_DETECTOR_BACKEND, workers still
+    on the old pair keep serving its version. Refuses while the version
+    would stop recognising any student.
+    """
+    version = db.session.get(GalleryVersion, version_id)
+    if version is None:
+        raise ValueError(f"Gallery version {version_id} not found")
+    if version.status not in ('ready', 'retired'):
+        raise ValueError(f"Gallery version {version_id} is {version.status}, not ready")
+    missing = students_missing_from(version.id)
+    if missing:
+        raise ValueError(
+            f"Gallery version {version_id} has no embeddings of {missing} enrolled students; "
+            f"re-enroll them and run reindex_gallery.py build --resume {version_id} first"
+        )
+
+    GalleryVersion.query.filter_by(
+        model_name=version.model_name, detector_backend=version.detector_backend, status='active'
+    ).update({'status': 'retired'}, synchronize_session=False)
+    version.status = 'active'
+    version.activated_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Activated gallery version {version.id} for {version.model_name}/{version.detector_backend}")
+    return version
+
+
+def rollback_gallery_version(model_name, detector_backend):
+    """Reactivate the version served before the current one.
+
+    The current version goes back to 'ready', so it can be activated again.
+    """
+    current = active_gallery_version(model_name, detector_backend)
+    if current is None:
+        raise ValueError(f"No active gallery version for {model_name}/{detector_backend}")
+    previous = GalleryVersion.query.filter(
+        GalleryVersion.model_name == model_name,
+        GalleryVersion.detector_backend == detector_backend,
+        GalleryVersion.status == 'retired',
+        GalleryVersion.activated_at < current.activated_at
+    ).order_by(GalleryVersion.activated_at.desc()).first()
+    if previous is None:
+        raise ValueError(f"No earlier gallery version of {model_name}/{detector_backend} to roll back to")
+
+    current.status = 'ready'
+    previous.status = 'active'
+    previous.activated_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Rolled gallery of {model_name}/{detector_backend} back from version {current.id} to {previous.id}")
+    return previous
+
+
+# Active version of the configured pair, as last read by this worker
+_serving_version = {'id': None, 'checked': None}
+_serving_version_lock = threading.Lock()
+
+
+def serving_gallery_version(app):
+    """Id of the version this worker should serve (None before versions
+    exist), re-read at most every FACE_INDEX_REFRESH_SECONDS. Needs an app context."""
+    checked = _serving_version['checked']
+    if checked is None or time.monotonic() - checked >= app.config['FACE_INDEX_REFRESH_SECONDS']:
+        with _serving_version_lock:
+            if _serving_version['checked'] is checked:
+                version = active_gallery_version(app.config['FACE_MODEL_NAME'], app.config['FACE_DETECTOR_BACKEND'])
+                _serving_version['id'] = version.id if version is not None else None
+                _serving_version['checked'] = time.monotonic()
+    return _serving_version['id']
@@ -0,0 +1,15 @@
+# File: backend/gunicorn.conf.py
+# Usage: gunicorn -c gunicorn.conf.py "app:create_app()"
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))  # > 1 lets FACE_MICROBATCH batch concurrent requests
+timeout = 120
+
+def post_worker_init(worker):
+    """Warm the face pipeline up in each worker right after it forks"""
+    from face_pipeline import start_warm_up
+    app = worker.wsgi
+    if app.config.get('FACE_WARMUP') == 'eager':
+        start_warm_up(app)
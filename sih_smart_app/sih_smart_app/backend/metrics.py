@@ -0,0 +1,103 @@
+# File: backend/metrics.py
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# Upper bounds of the latency buckets, in milliseconds (the last one is open)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every request"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = np.asarray(buckets, dtype=np.float64)
+        self.counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[np.searchsorted(self.buckets, ms)] += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q, counts):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not counts.sum():
+            return None
+        position = np.searchsorted(np.cumsum(counts), q * counts.sum())
+        return float(self.buckets[position]) if position < len(self.buckets) else round(self.max_ms, 2)
+
+    def snapshot(self):
+        with self._lock:
+            counts, total_ms, max_ms = self.counts.copy(), self.total_ms, self.max_ms
+        count = int(counts.sum())
+        labels = [f"le_{int(bound)}" for bound in self.buckets] + ['le_inf']
+        return {
+            'count': count,
+            'avg_ms': round(total_ms / count, 2) if count else None,
+            'p50_ms': self.quantile(0.5, counts),
+            'p95_ms': self.quantile(0.95, counts),
+            'max_ms': round(max_ms, 2),
+            'buckets': dict(zip(labels, np.cumsum(counts).tolist()))
+        }
+
+
+# Per-stage histograms of this worker process
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe_stage(name, ms):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram())
+    histogram.observe(ms)
+
+
+def stage_metrics():
+    return {name: histogram.snapshot() for name, histogram in sorted(_histograms.items())}
+
+
+class StageTimings:
+    """Durations of the stages of one request, summed per stage.
+
+    record() feeds them into the worker's histograms once the request is
+    done, so a stage run several times (e.g. detection on each photo)
+    counts as one observation.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + 1000 * seconds
+
+    def record(self):
+        self.stages['total'] = 1000 * (time.perf_counter() - self.started)
+        for name, ms in self.stages.items():
+            observe_stage(f"{self.prefix}.{name}", ms)
+
+    def server_timing(self):
+        """The stages as a Server-Timing header value"""
+        return ', '.join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
+
+
+def timed(timings, name):
+    """Time a block as a stage when timings are being collected"""
+    return timings.stage(name) if timings is not None else nullcontext()
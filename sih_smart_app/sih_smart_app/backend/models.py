@@ -41,6 +41,12 @@ class Section(db.Model):
     schedules = db.relationship('ClassSchedule', backref='section', lazy=True)
 
 class User(db.Model):
+    # (college_id, institution_id) serves login by college_id alone as well as per-institution lookups
+    __table_args__ = (
+        db.UniqueConstraint('college_id', 'institution_id', name='uq_user_college_institution'),
+        db.Index('ix_user_section_id', 'section_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     college_id = db.Column(db.String(50), nullable=False) # Registration Number
     password_hash = db.Column(db.String(255), nullable=False)
@@ -65,6 +71,7 @@ class User(db.Model):
 
     # Open Elective Enrollments
     enrolled_subjects = db.relationship('Subject', secondary=student_subjects, backref='enrolled_students')
+    face_embeddings = db.relationship('FaceEmbedding', backref='student', lazy=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -72,6 +79,60 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class FaceSample(db.Model):
+    """An enrollment photo kept on disk so it can be re-embedded by a new model"""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    institution_id = db.Column(db.Integer, db.ForeignKey('institution.id'), nullable=False)
+    image_path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GalleryVersion(db.Model):
+    """One set of embeddings of every face sample, made by one model and detector.
+
+    Workers serve the 'active' version of their configured model/detector;
+    new versions are built offline ('building' -> 'ready') by reindex_gallery.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    model_name = db.Column(db.String(50), nullable=False)
+    detector_backend = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='building') # 'building', 'ready', 'active', 'retired', 'failed'
+    samples_total = db.Column(db.Integer, default=0)
+    samples_done = db.Column(db.Integer, default=0)
+    last_sample_id = db.Column(db.Integer, default=0) # samples up to this id are embedded
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    activated_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "model_name": self.model_name,
+            "detector_backend": self.detector_backend,
+            "status": self.status,
+            "samples_total": self.samples_total,
+            "samples_done": self.samples_done,
+            "last_sample_id": self.last_sample_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "activated_at": self.activated_at.isoformat() if self.activated_at else None
+        }
+
+class FaceEmbedding(db.Model):
+    """One enrolled face sample, stored as raw float32 bytes.
+
+    Vectors are only comparable with those of the same model and detector.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    institution_id = db.Column(db.Integer, db.ForeignKey('institution.id'), nullable=False)
+    sample_id = db.Column(db.Integer, db.ForeignKey('face_sample.id'), nullable=True) # None for samples enrolled before photos were kept
+    gallery_version_id = db.Column(db.Integer, db.ForeignKey('gallery_version.id'), nullable=True)
+    model_name = db.Column(db.String(50), nullable=False)
+    detector_backend = db.Column(db.String(50), nullable=False)
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    sample = db.relationship('FaceSample')
+
 class Branch(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -92,6 +153,11 @@ class Subject(db.Model):
     semester_id = db.Column(db.Integer, db.ForeignKey('semester.id'), nullable=False)
 
 class ClassSchedule(db.Model):
+    __table_args__ = (
+        db.Index('ix_schedule_teacher_day', 'teacher_id', 'day_of_week'),
+        db.Index('ix_schedule_section_day', 'section_id', 'day_of_week'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -102,9 +168,123 @@ class ClassSchedule(db.Model):
     room = db.Column(db.String(50))
 
 class AttendanceRecord(db.Model):
+    # One record per student, class and day; saving a session again updates it
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'class_id', 'date', name='uq_attendance_student_class_date'),
+        db.Index('ix_attendance_student_date', 'student_id', 'date'),
+        db.Index('ix_attendance_class_date', 'class_id', 'date'),
+        db.Index('ix_attendance_timestamp', 'timestamp'),  # sessions saved since a time (attendance_analytics.py)
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('class_schedule.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False) # 'present', 'absent'
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AttendanceRoster(db.Model):
+    """Frozen ordering of a class's students that session bitmaps index into"""
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class_schedule.id'), nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False)
+    student_ids = db.Column(db.LargeBinary, nullable=False) # sorted little-endian int32 user ids
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AttendanceSession(db.Model):
+    """One class session in the bitset storage mode (ATTENDANCE_STORAGE=bitset).
+
+    Bit i of each bitmap is the i-th student of the roster; students with
+    a marked bit but no present bit were absent.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('class_id', 'date', name='uq_session_class_date'),
+        db.Index('ix_session_timestamp', 'timestamp'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class_schedule.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    roster_id = db.Column(db.Integer, db.ForeignKey('attendance_roster.id'), nullable=False)
+    present_bits = db.Column(db.LargeBinary, nullable=False)
+    marked_bits = db.Column(db.LargeBinary, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AttendanceRollup(db.Model):
+    """Present/total counters of one student in one subject for one month.
+
+    Kept in step with AttendanceRecord by every attendance save; rebuilt
+    from the records with attendance_rollups.py.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', 'month', name='uq_rollup_student_subject_month'),
+        db.Index('ix_rollup_institution_month', 'institution_id', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    institution_id = db.Column(db.Integer, db.ForeignKey('institution.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False) # first day of the month
+    present = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+class FaceAuditJob(db.Model):
+    """Background search of an institution's gallery for faces enrolled under two college IDs"""
+    id = db.Column(db.String(32), primary_key=True)
+    institution_id = db.Column(db.Integer, db.ForeignKey('institution.id'), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued') # 'queued', 'running', 'done', 'failed'
+    distance_threshold = db.Column(db.Float, nullable=False)
+    embeddings_scanned = db.Column(db.Integer, nullable=True)
+    pairs_found = db.Column(db.Integer, nullable=True)
+    pairs = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'distance_threshold': self.distance_threshold,
+            'embeddings_scanned': self.embeddings_scanned,
+            'pairs_found': self.pairs_found,
+            'pairs': self.pairs,
+            'error': self.error,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'run_ms': round((self.finished_at - self.started_at).total_seconds() * 1000) if self.started_at and self.finished_at else None
+        }
+
+class AttendanceJob(db.Model):
+    """Background face recognition of one attendance photo"""
+    id = db.Column(db.String(32), primary_key=True)
+    institution_id = db.Column(db.Integer, db.ForeignKey('institution.id'), nullable=False)
+    class_id = db.Column(db.Integer, db.ForeignKey('class_schedule.id'), nullable=True)
+    submitted_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued') # 'queued', 'done', 'failed'
+    faces_detected = db.Column(db.Integer, nullable=True)
+    present_college_ids = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        timings = {}
+        if self.started_at and self.finished_at:
+            timings = {
+                'queue_ms': round((self.started_at - self.submitted_at).total_seconds() * 1000),
+                'run_ms': round((self.finished_at - self.started_at).total_seconds() * 1000)
+            }
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'class_id': self.class_id,
+            'faces_detected': self.faces_detected,
+            'present_college_ids': self.present_college_ids,
+            'error': self.error,
+            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
+            'timings': timings
+        }
\ No newline at end of file
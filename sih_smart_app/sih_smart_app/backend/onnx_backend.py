@@ -0,0 +1,118 @@
+# File: backend/onnx_backend.py
+"""
+ONNX Runtime backend for the face embedding model (FACE_EMBED_BACKEND=onnx).
+The Keras model DeepFace builds is exported to ONNX once; workers then run
+inference through ONNX Runtime on CPU instead of TensorFlow. Detection and
+preprocessing still go through DeepFace, so embeddings stay comparable.
+
+Usage: python onnx_backend.py export [--model VGG-Face]
+       python onnx_backend.py parity [--model VGG-Face] [--samples 32]
+"""
+
+import os
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+from config import Config
+from face_pipeline import load_deepface, embed_faces, configure_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+
+def onnx_model_path(onnx_dir, model_name):
+    return os.path.join(onnx_dir, f"{model_name.lower().replace('-', '')}.onnx")
+
+
+class OnnxEmbeddingModel:
+    """An exported embedding model behind the interface the pipeline uses
+    (input_shape as (width, height), like DeepFace models, and forward_batch)"""
+
+    def __init__(self, path, intra_op_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = (model_input.shape[2], model_input.shape[1])
+
+    def forward_batch(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+def export_onnx_model(model_name, path, opset=17):
+    """Convert DeepFace's Keras model to ONNX (needs TensorFlow and tf2onnx)"""
+    import tensorflow as tf
+    import tf2onnx
+
+    keras_model = load_deepface().build_model(model_name).model
+    signature = (tf.TensorSpec((None,) + tuple(keras_model.input_shape[1:]), tf.float32, name='input'),)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # A name of our own, so concurrent exports never write the same file
+    handle, tmp_path = tempfile.mkstemp(suffix='.onnx.tmp', dir=os.path.dirname(path) or '.')
+    os.close(handle)
+    try:
+        tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=opset, output_path=tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Exported {model_name} to {path}")
+    return path
+
+
+def load_onnx_model(model_name, onnx_dir, intra_op_threads=0):
+    """Open the exported model; raises FileNotFoundError if it was never
+    exported (workers do not export it themselves)"""
+    path = onnx_model_path(onnx_dir, model_name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No ONNX export of {model_name} at {path}; "
+            f"run `python onnx_backend.py export --model {model_name} --onnx-dir {onnx_dir}` first"
+        )
+    return OnnxEmbeddingModel(path, intra_op_threads)
+
+
+def check_parity(model_name, onnx_dir, samples=32, seed=0, min_similarity=0.9999):
+    """Embed the same crops with both backends and compare them.
+
+    Returns the lowest cosine similarity between the two backends'
+    vectors and whether it clears min_similarity.
+    """
+    rng = np.random.default_rng(seed)
+    crops = [{'face': rng.random((side, side, 3), dtype=np.float32)} for side in rng.integers(40, 200, size=samples)]
+
+    configure_embedding_backend('tensorflow')
+    reference = embed_faces(crops, model_name)
+    configure_embedding_backend('onnx', onnx_dir)
+    candidate = embed_faces(crops, model_name)
+
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate /= np.linalg.norm(candidate, axis=1, keepdims=True)
+    lowest = float(np.min(np.sum(reference * candidate, axis=1)))
+    return lowest, lowest >= min_similarity
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the face embedding model to ONNX and check it")
+    parser.add_argument('command', choices=['export', 'parity'])
+    parser.add_argument('--model', default=Config.FACE_MODEL_NAME)
+    parser.add_argument('--onnx-dir', default=Config.FACE_ONNX_DIR)
+    parser.add_argument('--samples', type=int, default=32)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'export':
+        print(f"✅ {export_onnx_model(args.model, onnx_model_path(args.onnx_dir, args.model))}")
+    else:
+        lowest, ok = check_parity(args.model, args.onnx_dir, args.samples)
+        print(f"{'✅' if ok else '❌'} lowest cosine similarity between TensorFlow and ONNX embeddings: {lowest:.6f}")
+        raise SystemExit(0 if ok else 1)
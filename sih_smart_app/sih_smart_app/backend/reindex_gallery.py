@@ -0,0 +1,245 @@
+# File: backend/reindex_gallery.py
+"""
+Re-embed every stored enrollment photo into a new gallery version, offline,
+together with the legacy gallery images in KNOWN_FACES_DIR. Changing the face model or detector then never rebuilds embeddings on the
+request path: build the new version, activate it (workers switch to it on
+their next index refresh), and roll back if it misbehaves.
+
+Usage: python reindex_gallery.py build [--model Facenet512] [--detector retinaface] [--workers 4] [--activate]
+       python reindex_gallery.py build --resume 7
+       python reindex_gallery.py activate 7
+       python reindex_gallery.py rollback [--model VGG-Face] [--detector opencv]
+       python reindex_gallery.py list
+"""
+
+import os
+import time
+import pickle
+import logging
+import tempfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import Config
+from models import db, FaceSample, FaceEmbedding, GalleryVersion
+from face_index import deepface_representation_file
+from face_pipeline import decode_image, embed_enrollment_samples, warm_model, configure_embedding_backend
+from gallery_versions import activate_gallery_version, rollback_gallery_version, students_missing_from
+
+logger = logging.getLogger(__name__)
+
+# Settings of the pool processes, set once by _init_reindex_process
+_worker = {}
+
+
+def _init_reindex_process(model_name, detector_backend, max_dimension, embed_backend, onnx_dir, onnx_threads):
+    configure_embedding_backend(embed_backend, onnx_dir, onnx_threads)
+    _worker.update(model_name=model_name, detector_backend=detector_backend, max_dimension=max_dimension)
+    warm_model(model_name, detector_backend)
+
+
+def _embed_sample_files(paths):
+    """Embed one chunk of stored photos (runs in a pool process).
+
+    Returns (position in the chunk, float32 bytes) for each photo with a face.
+    """
+    images, kept = [], []
+    for position, path in enumerate(paths):
+        try:
+            with open(path, 'rb') as f:
+                images.append(decode_image(f.read(), _worker['max_dimension']))
+            kept.append(position)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping face sample {path}: {e}")
+    if not images:
+        return []
+    embeddings, _, positions = embed_enrollment_samples(images, _worker['model_name'], _worker['detector_backend'])
+    return [(kept[position], vector.astype('float32').tobytes()) for vector, position in zip(embeddings, positions)]
+
+
+def _legacy_images(db_path):
+    """Images of the legacy gallery: 'known_faces/COLLEGE_ID/*.jpg' and single images in 'known_faces/'"""
+    return sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(db_path) for name in names
+        if os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg', '.png')
+    )
+
+
+def _embed_legacy_gallery(executor, db_path, model_name, detector_backend, chunk_size):
+    """Write the legacy DeepFace pickle of a model/detector pair.
+
+    Students enrolled before face samples were stored exist only as images
+    in db_path, which workers read through this pickle. An existing pickle
+    is kept. Returns the number of images embedded, or None if kept.
+    """
+    pkl_path = deepface_representation_file(db_path, model_name, detector_backend)
+    if os.path.exists(pkl_path):
+        return None
+    paths = _legacy_images(db_path)
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    representations = [
+        {'identity': chunk[position], 'embedding': np.frombuffer(embedding, dtype=np.float32).tolist()}
+        for chunk, results in zip(chunks, executor.map(_embed_sample_files, chunks))
+        for position, embedding in results
+    ]
+    # Workers switch over only once the pickle is complete
+    handle, tmp_path = tempfile.mkstemp(suffix='.pkl.tmp', dir=db_path)
+    with os.fdopen(handle, 'wb') as f:
+        pickle.dump(representations, f)
+    os.replace(tmp_path, pkl_path)
+    logger.info(f"Embedded {len(representations)} of {len(paths)} legacy gallery images into {pkl_path}")
+    return len(representations)
+
+
+def build_gallery_version(app, model_name, detector_backend, workers=2, chunk_size=32, version_id=None):
+    """Embed every face sample with a model/detector pair into a gallery version.
+
+    Chunks of photos are embedded in parallel processes and committed in
+    sample order, so an interrupted build resumes (version_id) where it
+    stopped, and a ready version picks up samples enrolled since. Samples
+    enrolled while the build runs are picked up before it finishes. The
+    version ends 'ready'; it is not served until activated, which is
+    refused while it misses students the served gallery knows. The legacy
+    known_faces images get the pair's DeepFace pickle on the way.
+    """
+    with app.app_context():
+        if version_id is not None:
+            version = db.session.get(GalleryVersion, version_id)
+            if version is None or version.status not in ('building', 'failed', 'ready'):
+                raise ValueError(f"Gallery version {version_id} cannot be resumed")
+            model_name, detector_backend = version.model_name, version.detector_backend
+            version.status = 'building'
+        else:
+            version = GalleryVersion(model_name=model_name, detector_backend=detector_backend, status='building')
+            db.session.add(version)
+        db.session.commit()
+        logger.info(f"Building gallery version {version.id} with {model_name}/{detector_backend} on {workers} processes")
+
+        samples_dir = app.config['FACE_SAMPLES_DIR']
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_reindex_process,
+            initargs=(
+                model_name, detector_backend, app.config['FACE_MAX_IMAGE_DIMENSION'],
+                app.config['FACE_EMBED_BACKEND'], app.config['FACE_ONNX_DIR'], app.config['FACE_ONNX_THREADS']
+            )
+        )
+        started, embedded_now = time.monotonic(), 0
+        try:
+            while True:
+                # Enough chunks to keep every process busy; later samples come in the next round
+                samples = FaceSample.query.filter(
+                    FaceSample.id > (version.last_sample_id or 0)
+                ).order_by(FaceSample.id).limit(chunk_size * workers * 4).all()
+                if not samples:
+                    break
+                version.samples_total = (version.samples_done or 0) + FaceSample.query.filter(
+                    FaceSample.id > (version.last_sample_id or 0)
+                ).count()
+
+                chunks = [samples[start:start + chunk_size] for start in range(0, len(samples), chunk_size)]
+                paths = [[os.path.join(samples_dir, sample.image_path) for sample in chunk] for chunk in chunks]
+                for chunk, results in zip(chunks, executor.map(_embed_sample_files, paths)):
+                    db.session.add_all([
+                        FaceEmbedding(
+                            student_id=chunk[position].student_id,
+                            institution_id=chunk[position].institution_id,
+                            sample_id=chunk[position].id,
+                            gallery_version_id=version.id,
+                            model_name=model_name,
+                            detector_backend=detector_backend,
+                            embedding=embedding
+                        )
+                        for position, embedding in results
+                    ])
+                    version.samples_done = (version.samples_done or 0) + len(chunk)
+                    version.last_sample_id = chunk[-1].id
+                    db.session.commit()
+                    embedded_now += len(chunk)
+                    _log_progress(version, embedded_now, time.monotonic() - started)
+
+            _embed_legacy_gallery(executor, app.config['KNOWN_FACES_DIR'], model_name, detector_backend, chunk_size)
+            version.status = 'ready'
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            version.status = 'failed'
+            db.session.commit()
+            logger.error(f"Gallery version {version.id} failed after {version.samples_done} samples; resume it with --resume {version.id}")
+            raise
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+        logger.info(f"Gallery version {version.id} ready: {version.samples_done} samples in {time.monotonic() - started:.0f}s")
+        missing = students_missing_from(version.id)
+        if missing:
+            logger.warning(
+                f"Gallery version {version.id} has no embeddings of {missing} enrolled students "
+                f"(no stored enrollment photo or no face found, including legacy known_faces images); "
+                f"re-enroll them, then --resume {version.id}"
+            )
+        return version.id
+
+
+def _log_progress(version, embedded_now, seconds):
+    rate = embedded_now / seconds if seconds else 0.0
+    remaining = max(version.samples_total - version.samples_done, 0)
+    eta = f"{remaining / rate:.0f}s" if rate else "?"
+    percent = 100 * version.samples_done / version.samples_total if version.samples_total else 100.0
+    logger.info(
+        f"Gallery version {version.id}: {version.samples_done}/{version.samples_total} samples "
+        f"({percent:.1f}%), {rate:.1f} samples/s, ETA {eta}"
+    )
+
+
+def _activate(version_id):
+    try:
+        return activate_gallery_version(version_id)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Build, activate and roll back face gallery versions")
+    parser.add_argument('command', choices=['build', 'activate', 'rollback', 'list'])
+    parser.add_argument('version', type=int, nargs='?', help="version to activate")
+    parser.add_argument('--model', default=Config.FACE_MODEL_NAME)
+    parser.add_argument('--detector', default=Config.FACE_DETECTOR_BACKEND)
+    parser.add_argument('--workers', type=int, default=2, help="embedding processes")
+    parser.add_argument('--chunk-size', type=int, default=32, help="photos embedded per batch")
+    parser.add_argument('--resume', type=int, help="continue an interrupted build of this version")
+    parser.add_argument('--activate', action='store_true', help="activate the version once it is built")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    app = create_app()
+    if args.command == 'build':
+        version_id = build_gallery_version(app, args.model, args.detector, args.workers, args.chunk_size, args.resume)
+        print(f"✅ Gallery version {version_id} built")
+        if args.activate:
+            with app.app_context():
+                _activate(version_id)
+            print(f"✅ Gallery version {version_id} active")
+    elif args.command == 'activate':
+        if args.version is None:
+            parser.error("activate needs a version id")
+        with app.app_context():
+            version = _activate(args.version)
+            print(f"✅ Gallery version {version.id} active for {version.model_name}/{version.detector_backend}")
+    elif args.command == 'rollback':
+        with app.app_context():
+            version = rollback_gallery_version(args.model, args.detector)
+            print(f"✅ Rolled back to gallery version {version.id}")
+    else:
+        with app.app_context():
+            for version in GalleryVersion.query.order_by(GalleryVersion.id).all():
+                print(f"{version.id:>4}  {version.status:<9} {version.model_name}/{version.detector_backend}  "
+                      f"{version.samples_done}/{version.samples_total} samples  activated {version.activated_at or '-'}")
@@ -0,0 +1,79 @@
+# File: backend/result_cache.py
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def attendance_cache_key(images, gallery_version, institution_id, class_id, roster):
+    """SHA-256 of the decoded pixels of every photo plus everything the result depends on"""
+    digest = hashlib.sha256()
+    for img in images:
+        digest.update(repr(img.shape).encode())
+        digest.update(img.tobytes())
+    scope = (gallery_version, institution_id, class_id, sorted(roster) if roster is not None else None)
+    digest.update(repr(scope).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds.
+
+    Entries belong to a scope (e.g. an institution's gallery) and its
+    current generation (the gallery version); moving a scope to a new
+    generation drops everything cached under the old one.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync(self, generation, scope=None):
+        """Drop the entries of scope cached under an older generation"""
+        with self._lock:
+            if self._generations.get(scope) != generation:
+                self._generations[scope] = generation
+                for key in [k for k, entry in self._entries.items() if entry[1] == scope]:
+                    del self._entries[key]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, scope=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, scope, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# One cache per web worker
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache(app):
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(app.config['ATTENDANCE_CACHE_SIZE'], app.config['ATTENDANCE_CACHE_TTL'])
+    return _result_cache
@@ -0,0 +1,53 @@
+# File: backend/tests/conftest.py
+import os
+import sys
+from datetime import time
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from models import db, Institution, Branch, Semester, Subject, Batch, Section, User, ClassSchedule
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on a fresh database, with its folders under tmp_path.
+
+    Runs on SQLite unless TEST_DATABASE_URL names another database (e.g.
+    PostgreSQL or MySQL, for the upsert paths of attendance_store.py).
+    """
+    from app import create_app
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'app.db'}")
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def school(app):
+    """One institution with a class of four students in one section:
+    {'institution_id', 'subject_id', 'class_id', 'students': {college_id: user id}}"""
+    db.session.add(Institution(id=1, name='Test', registration_code='TEST'))
+    db.session.add(Branch(id=1, name='Computer Science', code='CS', institution_id=1))
+    db.session.add(Semester(id=1, number=1, branch_id=1))
+    db.session.add(Subject(id=1, name='Algorithms', code='CS101', semester_id=1))
+    db.session.add(Batch(id=1, name='2026', institution_id=1))
+    db.session.add(Section(id=1, name='A', batch_id=1, branch_id=1))
+    db.session.add(User(id=1, college_id='T1', password_hash='-', name='Teacher', role='teacher', institution_id=1))
+    students = {f"S{number}": 10 + number for number in range(1, 5)}
+    db.session.add_all([
+        User(id=user_id, college_id=college_id, password_hash='-', name='Student', role='student', institution_id=1, section_id=1)
+        for college_id, user_id in students.items()
+    ])
+    db.session.add(ClassSchedule(id=1, subject_id=1, teacher_id=1, section_id=1, day_of_week=0,
+                                 start_time=time(9, 0), end_time=time(10, 0)))
+    db.session.commit()
+    return {'institution_id': 1, 'subject_id': 1, 'class_id': 1, 'students': students}
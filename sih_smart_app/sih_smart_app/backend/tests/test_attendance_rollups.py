@@ -0,0 +1,65 @@
+# File: backend/tests/test_attendance_rollups.py
+from collections import Counter
+from datetime import date
+
+import pytest
+
+from models import db, AttendanceRollup
+from attendance_store import save_attendance_records
+from attendance_sessions import attendance_records
+from attendance_rollups import rebuild_rollups
+
+# Two sessions in March, one in April
+DAYS = [date(2026, 3, 2), date(2026, 3, 9), date(2026, 4, 6)]
+
+
+def stored_counters():
+    return {
+        (rollup.student_id, rollup.subject_id, rollup.month): (rollup.present, rollup.total)
+        for rollup in AttendanceRollup.query if rollup.total
+    }
+
+
+def recounted_counters(subject_id):
+    """The counters recounted from the stored attendance"""
+    present, total = Counter(), Counter()
+    for record in attendance_records():
+        key = (record['student_id'], subject_id, record['date'].replace(day=1))
+        total[key] += 1
+        present[key] += record['status'] == 'present'
+    return {key: (present[key], total[key]) for key in total}
+
+
+def save_changes(storage, class_id):
+    save_attendance_records(1, class_id, DAYS[0], {'S1': True, 'S2': False, 'S3': True}, storage)
+    save_attendance_records(1, class_id, DAYS[1], {'S1': True, 'S2': True, 'S3': False, 'S4': False}, storage)
+    save_attendance_records(1, class_id, DAYS[2], {'S1': False, 'S4': True}, storage)
+    # present -> absent, absent -> present, the same status again, and a student added to the session
+    save_attendance_records(1, class_id, DAYS[0], {'S1': False, 'S2': True, 'S3': True, 'S4': True}, storage)
+    # the same session saved again unchanged
+    save_attendance_records(1, class_id, DAYS[1], {'S1': True, 'S2': True, 'S3': False, 'S4': False}, storage)
+
+
+@pytest.mark.parametrize('storage', ['rows', 'bitset'])
+def test_counters_follow_saved_changes(school, storage):
+    save_changes(storage, school['class_id'])
+    assert stored_counters() == recounted_counters(school['subject_id'])
+
+
+@pytest.mark.parametrize('storage', ['rows', 'bitset'])
+def test_rebuild_matches_recount(school, storage):
+    save_changes(storage, school['class_id'])
+    incremental = stored_counters()
+    AttendanceRollup.query.update({'present': 0, 'total': 99})
+    db.session.commit()
+
+    rebuild_rollups(school['institution_id'])
+    assert stored_counters() == recounted_counters(school['subject_id']) == incremental
+
+
+def test_switching_storage_keeps_counters(school):
+    save_attendance_records(1, school['class_id'], DAYS[0], {'S1': True, 'S2': False}, 'rows')
+    save_attendance_records(1, school['class_id'], DAYS[0], {'S2': True, 'S3': False}, 'bitset')
+    save_attendance_records(1, school['class_id'], DAYS[0], {'S1': False}, 'rows')
+    assert stored_counters() == recounted_counters(school['subject_id'])
+    assert stored_counters()[(school['students']['S2'], school['subject_id'], date(2026, 3, 1))] == (1, 1)
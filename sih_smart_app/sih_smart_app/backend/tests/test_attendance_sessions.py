@@ -0,0 +1,85 @@
+# File: backend/tests/test_attendance_sessions.py
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from models import db, User, AttendanceRecord, AttendanceRoster, AttendanceSession
+from attendance_store import save_attendance_records
+from attendance_sessions import encode_bits, decode_bits, write_session, session_statuses, decode_sessions, attendance_records
+
+DAY = date(2026, 3, 2)
+
+
+@pytest.mark.parametrize('size', [1, 7, 8, 9, 61])
+def test_bits_round_trip(size):
+    mask = np.random.default_rng(size).random(size) < 0.5
+    data = encode_bits(mask)
+    assert len(data) == (size + 7) // 8
+    assert (decode_bits(data, size) == mask).all()
+
+
+def test_session_round_trip(school):
+    students = school['students']
+    statuses = {students['S1']: 'present', students['S2']: 'absent', students['S4']: 'present'}
+    write_session(school['class_id'], DAY, statuses, datetime.utcnow())
+    db.session.commit()
+
+    session = AttendanceSession.query.one()
+    assert session_statuses(session) == statuses
+    columns = decode_sessions([session])
+    assert dict(zip(columns['student_id'].tolist(), columns['present'].tolist())) == {
+        student_id: status == 'present' for student_id, status in statuses.items()
+    }
+    assert set(columns['date'].tolist()) == {DAY}
+
+
+def test_student_joining_after_the_roster_was_frozen(school):
+    class_id = school['class_id']
+    save_attendance_records(1, class_id, DAY, {'S1': True, 'S2': False}, 'bitset')
+    first_roster = AttendanceSession.query.one().roster_id
+
+    db.session.add(User(id=50, college_id='S5', password_hash='-', name='Student', role='student', institution_id=1, section_id=1))
+    db.session.commit()
+    later = date(2026, 3, 9)
+    save_attendance_records(1, class_id, later, {'S1': True, 'S5': True}, 'bitset')
+
+    # The earlier session keeps its roster; the new student gets a new one
+    sessions = {session.date: session for session in AttendanceSession.query}
+    assert sessions[DAY].roster_id == first_roster != sessions[later].roster_id
+    assert AttendanceRoster.query.count() == 2
+    students = school['students']
+    assert session_statuses(sessions[DAY]) == {students['S1']: 'present', students['S2']: 'absent'}
+    assert session_statuses(sessions[later]) == {students['S1']: 'present', 50: 'present'}
+
+    # Marking the new student in the earlier session moves it onto the new roster
+    save_attendance_records(1, class_id, DAY, {'S5': False}, 'bitset')
+    session = db.session.get(AttendanceSession, sessions[DAY].id)
+    assert session.roster_id == sessions[later].roster_id
+    assert session_statuses(session) == {students['S1']: 'present', students['S2']: 'absent', 50: 'absent'}
+
+
+def stored_statuses():
+    return {(record['student_id'], record['status']) for record in attendance_records()}
+
+
+def test_switching_a_day_from_rows_to_bitset(school):
+    students, class_id = school['students'], school['class_id']
+    save_attendance_records(1, class_id, DAY, {'S1': True, 'S2': False, 'S3': True}, 'rows')
+    save_attendance_records(1, class_id, DAY, {'S2': True, 'S4': False}, 'bitset')
+
+    assert AttendanceRecord.query.count() == 0
+    assert AttendanceSession.query.count() == 1
+    assert stored_statuses() == {
+        (students['S1'], 'present'), (students['S2'], 'present'), (students['S3'], 'present'), (students['S4'], 'absent')
+    }
+
+
+def test_switching_a_day_from_bitset_to_rows(school):
+    students, class_id = school['students'], school['class_id']
+    save_attendance_records(1, class_id, DAY, {'S1': True, 'S2': False}, 'bitset')
+    save_attendance_records(1, class_id, DAY, {'S1': False, 'S3': True}, 'rows')
+
+    assert AttendanceSession.query.count() == 0
+    assert AttendanceRecord.query.count() == 3
+    assert stored_statuses() == {(students['S1'], 'absent'), (students['S2'], 'absent'), (students['S3'], 'present')}
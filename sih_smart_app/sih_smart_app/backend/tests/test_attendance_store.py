@@ -0,0 +1,51 @@
+# File: backend/tests/test_attendance_store.py
+from datetime import date
+
+import pytest
+
+from config import Config
+from models import db, AttendanceRecord
+from attendance_store import save_attendance_records, check_attendance_storage
+
+DAY = date(2026, 3, 2)
+
+
+def stored_records(class_id):
+    return {
+        (student_id, status) for student_id, status in
+        db.session.query(AttendanceRecord.student_id, AttendanceRecord.status).filter_by(class_id=class_id, date=DAY)
+    }
+
+
+def test_saving_a_session_again_updates_its_records(school):
+    students, class_id = school['students'], school['class_id']
+    saved, unknown = save_attendance_records(1, class_id, DAY, {'S1': True, 'S2': False, 'S3': True}, 'rows')
+    assert (saved, unknown) == (3, [])
+
+    saved, unknown = save_attendance_records(1, class_id, DAY, {'S1': False, 'S2': False, 'S4': True, 'X9': True}, 'rows')
+    assert (saved, unknown) == (3, ['X9'])
+    assert AttendanceRecord.query.filter_by(class_id=class_id, date=DAY).count() == 4
+    assert stored_records(class_id) == {
+        (students['S1'], 'absent'), (students['S2'], 'absent'), (students['S3'], 'present'), (students['S4'], 'present')
+    }
+
+
+def test_unknown_class_is_rejected(school):
+    with pytest.raises(ValueError):
+        save_attendance_records(1, 99, DAY, {'S1': True}, 'rows')
+
+
+def test_unknown_storage_fails_at_startup(tmp_path, monkeypatch):
+    from app import create_app
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(Config, 'ATTENDANCE_STORAGE', 'columns')
+    with pytest.raises(ValueError, match='ATTENDANCE_STORAGE'):
+        create_app()
+
+
+def test_database_without_upsert_is_rejected():
+    check_attendance_storage('bitset', 'postgresql')
+    with pytest.raises(ValueError):
+        check_attendance_storage('rows', 'mssql')
@@ -0,0 +1,20 @@
+# File: backend/tests/test_db_indexes.py
+from sqlalchemy import create_engine, text
+
+from db_indexes import seed, full_scans, upgrade
+
+
+def test_hot_queries_use_an_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    seed(engine, rows=50000)
+    assert full_scans(engine) == {}
+
+
+def test_dropped_index_is_reported(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    seed(engine, rows=50000)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_schedule_teacher_day"))
+    assert 'teacher_timetable' in full_scans(engine)
+    assert upgrade(engine) == ['ix_schedule_teacher_day']
+    assert full_scans(engine) == {}
@@ -0,0 +1,57 @@
+# File: backend/tests/test_gallery_versions.py
+import os
+import pickle
+
+import pytest
+
+from models import db, Institution, User, GalleryVersion, FaceEmbedding
+from face_index import deepface_representation_file
+from gallery_versions import students_missing_from, activate_gallery_version
+
+
+def write_legacy_pickle(app, model_name, college_ids):
+    db_path = app.config['KNOWN_FACES_DIR']
+    with open(deepface_representation_file(db_path, model_name, app.config['FACE_DETECTOR_BACKEND']), 'wb') as f:
+        pickle.dump([{'identity': os.path.join(db_path, f"{college_id}.jpg"), 'embedding': [1.0, 0.0]} for college_id in college_ids], f)
+
+
+@pytest.fixture
+def versions(app):
+    db.session.add(Institution(id=1, name='Test', registration_code='TEST'))
+    db.session.add_all([
+        User(id=student, college_id=f"S{student}", password_hash='-', name='Student', role='student', institution_id=1)
+        for student in (1, 2)
+    ])
+    served = GalleryVersion(model_name=app.config['FACE_MODEL_NAME'], detector_backend=app.config['FACE_DETECTOR_BACKEND'], status='active')
+    built = GalleryVersion(model_name='Facenet512', detector_backend=app.config['FACE_DETECTOR_BACKEND'], status='ready')
+    db.session.add_all([served, built])
+    db.session.flush()
+    for version, students in ((served, (1, 2)), (built, (1, 2))):
+        db.session.add_all([
+            FaceEmbedding(student_id=student, institution_id=1, gallery_version_id=version.id, model_name=version.model_name,
+                          detector_backend=version.detector_backend, embedding=b'\0' * 8)
+            for student in students
+        ])
+    db.session.commit()
+    return served.id, built.id
+
+
+def test_students_without_embeddings_block_activation(app, versions):
+    _, built = versions
+    FaceEmbedding.query.filter_by(gallery_version_id=built, student_id=2).delete()
+    db.session.commit()
+    assert students_missing_from(built) == 1
+    with pytest.raises(ValueError):
+        activate_gallery_version(built)
+
+
+def test_legacy_students_block_activation(app, versions):
+    _, built = versions
+    write_legacy_pickle(app, app.config['FACE_MODEL_NAME'], ['L1', 'L2'])
+    assert students_missing_from(built) == 2
+    with pytest.raises(ValueError):
+        activate_gallery_version(built)
+
+    write_legacy_pickle(app, 'Facenet512', ['L1', 'L2'])
+    assert students_missing_from(built) == 0
+    assert activate_gallery_version(built).status == 'active'
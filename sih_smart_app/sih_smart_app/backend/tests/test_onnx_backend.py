@@ -0,0 +1,23 @@
+# File: backend/tests/test_onnx_backend.py
+import os
+
+import pytest
+
+# The parity check needs both backends and the exporter
+for module in ('tensorflow', 'deepface', 'onnxruntime', 'tf2onnx'):
+    pytest.importorskip(module)
+
+from config import Config
+from face_pipeline import configure_embedding_backend
+from onnx_backend import export_onnx_model, onnx_model_path, check_parity
+
+
+def test_onnx_embeddings_match_tensorflow(tmp_path):
+    # ONNX_PARITY_MODEL picks another model than the configured one
+    model_name = os.environ.get('ONNX_PARITY_MODEL') or Config.FACE_MODEL_NAME
+    export_onnx_model(model_name, onnx_model_path(str(tmp_path), model_name))
+    try:
+        lowest, ok = check_parity(model_name, str(tmp_path), samples=8)
+    finally:
+        configure_embedding_backend(Config.FACE_EMBED_BACKEND, Config.FACE_ONNX_DIR, Config.FACE_ONNX_THREADS)
+    assert ok, f"lowest cosine similarity between TensorFlow and ONNX embeddings: {lowest:.6f}"
@@ -0,0 +1,149 @@
+# File: backend/video_pipeline.py
+import os
+import logging
+import tempfile
+
+import numpy as np
+
+from face_index import normalize_rows
+from face_pipeline import detect_faces, embed_faces, face_boxes, box_iou
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+def sample_video_frames(path, sample_fps, max_seconds, max_dimension=None):
+    """Yield (seconds, BGR frame) about sample_fps times per second of video.
+
+    Only one frame is held at a time: frames between samples are grabbed
+    but never converted, and the clip is cut off after max_seconds.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Unsupported or corrupt video")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        fps = fps if fps and fps > 0 else 25.0
+        step = max(int(round(fps / sample_fps)), 1)
+        position = 0
+        while position / fps <= max_seconds and capture.grab():
+            if position % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                height, width = frame.shape[:2]
+                if max_dimension and max(height, width) > max_dimension:
+                    scale = max_dimension / max(height, width)
+                    frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+                yield position / fps, frame
+            position += 1
+    finally:
+        capture.release()
+
+
+class FaceTracker:
+    """Links detections of the same face across sampled frames by box overlap.
+
+    A track keeps only its crops_per_track sharpest-looking crops (largest,
+    most confident), so memory stays bounded however long the clip is.
+    Tracks not seen for more than max_gap samples are closed.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_gap=2, crops_per_track=3):
+        self.iou_threshold = iou_threshold
+        self.max_gap = max_gap
+        self.crops_per_track = crops_per_track
+        self.frame = 0
+        self.active = []
+        self.closed = []
+
+    def _keep_crop(self, track, face, box):
+        quality = float((box[2] - box[0]) * (box[3] - box[1]) * face.get('confidence', 1.0))
+        track['crops'].append((quality, face))
+        track['crops'].sort(key=lambda crop: crop[0], reverse=True)
+        del track['crops'][self.crops_per_track:]
+        track['box'] = box
+        track['last_frame'] = self.frame
+
+    def update(self, faces):
+        """Assign one sampled frame's detections to tracks"""
+        boxes = face_boxes(faces)
+        unmatched = set(range(len(faces)))
+        if self.active and len(faces):
+            iou = box_iou(np.stack([track['box'] for track in self.active]), boxes)
+            taken = set()
+            # Greedily pair the most overlapping track/detection first
+            for flat in np.argsort(-iou, axis=None):
+                track_pos, face_pos = np.unravel_index(flat, iou.shape)
+                if iou[track_pos, face_pos] < self.iou_threshold:
+                    break
+                if track_pos in taken or face_pos not in unmatched:
+                    continue
+                taken.add(track_pos)
+                unmatched.discard(face_pos)
+                self._keep_crop(self.active[track_pos], faces[face_pos], boxes[face_pos])
+
+        for face_pos in sorted(unmatched):
+            track = {'crops': []}
+            self._keep_crop(track, faces[face_pos], boxes[face_pos])
+            self.active.append(track)
+
+        still_active = []
+        for track in self.active:
+            (still_active if self.frame - track['last_frame'] <= self.max_gap else self.closed).append(track)
+        self.active = still_active
+        self.frame += 1
+
+    def tracks(self):
+        """Crops kept for every track seen so far"""
+        return [[face for _, face in track['crops']] for track in self.closed + self.active]
+
+
+def represent_video(path, model_name, detector_backend, sample_fps=2.0, max_seconds=30,
+                    max_dimension=None, crops_per_track=3, batch_size=32, workers=1, batcher=None, timings=None):
+    """One embedding per face track of a classroom video.
+
+    The detector runs on sampled frames only, and each track's few best
+    crops are embedded together and averaged. Returns the track embeddings
+    and the number of frames sampled.
+    """
+    tracker = FaceTracker(crops_per_track=crops_per_track)
+    sampled = 0
+    frames = sample_video_frames(path, sample_fps, max_seconds, max_dimension)
+    while True:
+        with timed(timings, 'decode'):
+            _, frame = next(frames, (None, None))
+        if frame is None:
+            break
+        with timed(timings, 'detect'):
+            faces = detect_faces(frame, detector_backend)
+        with timed(timings, 'track'):
+            tracker.update(faces)
+        sampled += 1
+
+    tracks = tracker.tracks()
+    crops = [face for track in tracks for face in track]
+    if not crops:
+        return np.zeros((0, 0), dtype=np.float32), sampled
+
+    with timed(timings, 'embed'):
+        embeddings = normalize_rows(embed_faces(crops, model_name, batch_size=batch_size, workers=workers, batcher=batcher))
+    starts = np.cumsum([0] + [len(track) for track in tracks[:-1]])
+    averaged = np.add.reduceat(embeddings, starts, axis=0)
+    logger.info(f"Video: {sampled} frames sampled, {len(tracks)} face tracks, {len(crops)} crops embedded")
+    return averaged, sampled
+
+
+def represent_video_upload(file, model_name, detector_backend, timings=None, **options):
+    """Spool an uploaded video to a temporary file (OpenCV reads from paths)
+    and embed its face tracks; the file is removed afterwards"""
+    suffix = os.path.splitext(file.filename or '')[1] or '.mp4'
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with timed(timings, 'upload'), os.fdopen(handle, 'wb') as f:
+            file.save(f)
+        return represent_video(path, model_name, detector_backend, timings=timings, **options)
+    finally:
+        os.remove(path)